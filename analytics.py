@@ -4,73 +4,72 @@ import plotly.express as px
 import pandas as pd
 from datetime import datetime, timedelta
 import streamlit as st
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from room_occupancy import build_occupancy_matrix
+from room_management import display_room_occupancy
+from schedule_store import (
+    load_active_schedule,
+    load_analytics_snapshot,
+    list_analytics_snapshots,
+    load_schedule_aggregates,
+    load_professor_workload
+)
+
+def _live_snapshot():
+    """Same shape as the saved snapshot, from SQL aggregates (for versions
+    saved before snapshots existed)"""
+    aggregates = load_schedule_aggregates()
+    jury = {}
+    for row in load_professor_workload():
+        jury.setdefault(row['professor'], {})[row['role']] = row['presentations']
+    return {
+        'departments': dict(aggregates['department']),
+        'rooms': {room: {'presentations': count} for room, count in aggregates['room']},
+        'days': {str(day): count for day, count in aggregates['day']},
+        'supervisors': {name: roles['Supervisor'] for name, roles in jury.items() if roles.get('Supervisor')},
+        'jury': jury
+    }
 
 def display_analytics_dashboard():
     """Display analytics dashboard with project statistics"""
     st.title("Analytics Dashboard")
 
-    # Get database connection
-    conn = psycopg2.connect(
-        host=os.getenv("PGHOST","aws-0-eu-central-1.pooler.supabase.com"),
-        database=os.getenv("PGDATABASE","postgres"),
-        user=os.getenv("PGUSER","postgres.lvonpafzqjfxqenzvjth"),
-        password=os.getenv("PGPASSWORD","trtrtr123"),
-        port=os.getenv("PGPORT","5432")
-    )
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    # Query schedule data
-    cur.execute("""
-        SELECT date_time, topic, student, room, president, rapporteur, supervisor
-        FROM schedules
-        ORDER BY date_time
-    """)
-    schedule_data = cur.fetchall()
-
-    if not schedule_data:
+    # One small record written when the schedule was saved
+    snapshot = load_analytics_snapshot() or _live_snapshot()
+
+    if not snapshot['departments']:
         st.info("No schedule data available for analysis.")
         return
 
-    # Convert to DataFrame
-    df = pd.DataFrame(schedule_data)
-
-    # Get department data using project classifier
-    from project_classifier import classifier
-    df['department'] = df['topic'].apply(classifier.classify_project)
-
     # Projects per Department
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Projects by Department")
-        dept_counts = df.groupby("department").size().reset_index(name="count")
+        dept_counts = pd.DataFrame(list(snapshot['departments'].items()), columns=["department", "count"])
         fig_dept = px.pie(dept_counts, values="count", names="department")
         st.plotly_chart(fig_dept)
 
     with col2:
         st.subheader("Presentations per Room")
-        room_counts = df.groupby("room").size().reset_index(name="count")
+        room_counts = pd.DataFrame(
+            [(room, stats['presentations']) for room, stats in snapshot['rooms'].items()],
+            columns=["room", "count"]
+        )
         fig_room = px.bar(room_counts, x="room", y="count")
         st.plotly_chart(fig_room)
+        if 'totals' in snapshot:
+            st.metric("Room utilization", f"{snapshot['totals']['room_utilization']:.0%}")
 
     # Timeline of Presentations
     st.subheader("Presentation Timeline")
-    df["date"] = pd.to_datetime(df["date_time"]).dt.date
-    timeline_data = df.groupby("date").size().reset_index(name="presentations")
+    timeline_data = pd.DataFrame(list(snapshot['days'].items()), columns=["date", "presentations"])
     fig_timeline = px.line(timeline_data, x="date", y="presentations",
                           title="Number of Presentations per Day")
     st.plotly_chart(fig_timeline)
 
     # Supervisor Statistics
     st.subheader("Supervisor Statistics")
-    supervisor_counts = df.groupby("supervisor").size().reset_index(name="projects")
+    supervisor_counts = pd.DataFrame(list(snapshot['supervisors'].items()), columns=["supervisor", "projects"])
     supervisor_counts = supervisor_counts.sort_values("projects", ascending=False)
     fig_supervisor = px.bar(supervisor_counts, x="supervisor", y="projects",
                            title="Projects per Supervisor")
@@ -78,10 +77,11 @@ def display_analytics_dashboard():
 
     # Jury Member Activity
     st.subheader("Jury Member Activity")
-    jury_data = pd.concat([
-        df["president"].value_counts().rename("As President"),
-        df["rapporteur"].value_counts().rename("As Rapporteur")
-    ], axis=1).fillna(0)
+    jury_data = pd.DataFrame([
+        (name, roles.get('President', 0), roles.get('Rapporteur', 0))
+        for name, roles in snapshot['jury'].items()
+    ], columns=["professor", "As President", "As Rapporteur"]).set_index("professor")
+    jury_data = jury_data[(jury_data["As President"] + jury_data["As Rapporteur"]) > 0]
 
     jury_data["Total"] = jury_data["As President"] + jury_data["As Rapporteur"]
     jury_data = jury_data.sort_values("Total", ascending=False)
@@ -93,6 +93,30 @@ def display_analytics_dashboard():
     fig_jury.update_layout(barmode="stack", title="Jury Member Participation")
     st.plotly_chart(fig_jury)
 
-    # Close database connection
-    cur.close()
-    conn.close()
\ No newline at end of file
+    # Days on campus
+    if 'professor_days' in snapshot:
+        st.subheader("Professor Days on Campus")
+        days_data = pd.DataFrame(list(snapshot['professor_days'].items()), columns=["professor", "days"])
+        days_data = days_data.sort_values("days", ascending=False)
+        fig_days = px.bar(days_data, x="professor", y="days", title="Days with at least one presentation")
+        st.plotly_chart(fig_days)
+
+    # Room x slot occupancy of the active schedule
+    st.subheader("Room Occupancy")
+    schedule = load_active_schedule()
+    if schedule:
+        display_room_occupancy(build_occupancy_matrix(schedule))
+
+    show_session_comparison()
+
+def show_session_comparison():
+    """Totals of every saved schedule version, from their snapshots"""
+    snapshots = list_analytics_snapshots()
+    if len(snapshots) < 2:
+        return
+    with st.expander("Compare Schedule Versions"):
+        comparison = pd.DataFrame([
+            {'Version': version_id, 'Saved At': created_at, **snapshot['totals']}
+            for version_id, created_at, snapshot in snapshots
+        ])
+        st.dataframe(comparison, use_container_width=True)
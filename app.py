@@ -4,23 +4,35 @@ st.set_page_config(page_title="PFE Schedule Manager", layout="wide")
 import pandas as pd
 from datetime import datetime, timedelta
 import tempfile
-import os
 import io
-import plotly.graph_objects as go
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import json
 from dotenv import load_dotenv
 import logging
 
-# Import local modules using absolute imports 
-from pfescheduler import PFEScheduler
-from google_forms import create_student_form
-from analytics import display_analytics_dashboard
-from calendar_integration import generate_ical_calendar, export_to_google_calendar
-from notification_system import send_schedule_notification
-from room_management import display_room_management
-from project_classifier import classifier
+# Import local modules using absolute imports. Modules that pull in heavy
+# dependencies (reportlab, sklearn, googleapiclient, plotly) are imported
+# inside the tab or button that needs them to keep cold starts fast.
+from notification_outbox import (
+    enqueue_schedule_notifications,
+    list_dead_letters,
+    outbox_progress,
+    retry_dead_letters,
+    start_outbox_worker
+)
+from room_management import display_room_management, display_room_occupancy
+from schedule_export import write_schedule_csv, write_schedule_html
+from db import get_cursor, rerun_scope, fetch_keyset_page, estimate_row_count
+from schema import init_schema
+from schedule_store import (
+    save_schedule_version,
+    load_active_schedule,
+    load_student_schedule,
+    load_professor_schedule,
+    list_schedule_versions,
+    activate_schedule_version,
+    backfill_classifications,
+    schedule_cache
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,244 +41,183 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Database configuration
-DB_HOST = os.getenv("PGHOST", "aws-0-eu-central-1.pooler.supabase.com")
-DB_NAME = os.getenv("PGDATABASE", "postgres")
-DB_USER = os.getenv("PGUSER", "postgres.lvonpafzqjfxqenzvjth")
-DB_PASSWORD = os.getenv("PGPASSWORD", "trtrtr123")
-DB_PORT = os.getenv("PGPORT", "5432")
-
-def get_db_connection():
-    try:
-        return psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            port=DB_PORT
-        )
-    except Exception as e:
-        st.error(f"Failed to connect to database: {str(e)}")
-        logger.error(f"Database connection error: {str(e)}")
-        raise
-
 def init_database():
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Create tables if they don't exist
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS schedules (
-            id SERIAL PRIMARY KEY,
-            date_time TIMESTAMP,
-            topic TEXT,
-            student TEXT,
-            room TEXT,
-            president TEXT,
-            rapporteur TEXT,
-            supervisor TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Add student_submissions table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS student_submissions (
-            id SERIAL PRIMARY KEY,
-            full_name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            project_title TEXT NOT NULL,
-            supervisor TEXT NOT NULL,
-            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_cursor() as cur:
+        # Create tables if they don't exist (Postgres or SQLite, see DB_BACKEND)
+        init_schema(cur)
 
 def save_schedule_to_db(schedule_data):
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Clear existing schedule
-    cur.execute("DELETE FROM schedules")
-
-    # Insert new schedule
-    for item in schedule_data:
-        cur.execute("""
-            INSERT INTO schedules 
-            (date_time, topic, student, room, president, rapporteur, supervisor)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            datetime.strptime(item['Date & Time'], '%Y-%m-%d %H:%M'),
-            item['Topic'],
-            item['Student'],
-            item['Room'],
-            item['President'],
-            item['Rapporteur'],
-            item['Supervisor']
-        ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Save a generated schedule as a new version and make it active.
+
+    Only inserted, changed and deleted rows are written (see
+    schedule_store.save_schedule_version), in a single transaction, so readers
+    keep seeing the previous version until the new one is committed.
+    The iCal feeds of every participant are published right after, so
+    calendar downloads are file reads.
+    """
+    from calendar_integration import publish_ical_feeds
+    result = save_schedule_version(schedule_data)
+    publish_ical_feeds(result['version'])
+    return result
 
 def load_schedule_from_db():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-        SELECT * FROM schedules 
-        ORDER BY date_time
-    """)
-
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    if rows:
-        schedule_data = []
-        for row in rows:
-            schedule_data.append({
-                'date': row['date_time'].strftime('%Y-%m-%d %H:%M'),
-                'topic': row['topic'],
-                'student': row['student'],
-                'room': row['room'],
-                'jury': [
-                    {'role': 'President', 'name': row['president']},
-                    {'role': 'Rapporteur', 'name': row['rapporteur']},
-                    {'role': 'Supervisor', 'name': row['supervisor']}
-                ]
-            })
-        return schedule_data
-    return None
+    """Active schedule, served from the process-wide cache until a new
+    version is saved or activated"""
+    return load_active_schedule()
 
 def show_professor_schedule():
     st.title(f"Professor Schedule - {st.session_state.user_id}")
 
-    schedule_data = load_schedule_from_db()
-    if schedule_data is not None:
-        professor_schedule = []
-        for item in schedule_data:
-            for jury_member in item['jury']:
-                if jury_member['name'].strip() == st.session_state.user_id.strip():
-                    professor_schedule.append({
-                        'Date & Time': item['date'],
-                        'Role': jury_member['role'],
-                        'Student': item['student'],
-                        'Topic': item['topic'],
-                        'Room': item['room']
-                    })
-                    break
-
-        if professor_schedule:
-            df = pd.DataFrame(professor_schedule)
-            st.dataframe(df, use_container_width=True)
+    # Indexed lookup of this professor's rows only
+    professor_schedule = load_professor_schedule(st.session_state.user_id)
+    if professor_schedule:
+        df = pd.DataFrame(professor_schedule)
+        st.dataframe(df, use_container_width=True)
 
-            # Add calendar export options
-            st.subheader("Export Calendar")
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("Export to iCal"):
-                    ical_data = generate_ical_calendar(
-                        user_id=st.session_state.user_id,
-                        user_role="professor"
-                    )
-                    st.download_button(
-                        "Download iCal File",
-                        data=ical_data,
-                        file_name="professor_schedule.ics",
-                        mime="text/calendar"
-                    )
+        # Add calendar export options
+        st.subheader("Export Calendar")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Export to iCal"):
+                from calendar_integration import get_ical_calendar
+                ical_data = get_ical_calendar(
+                    user_id=st.session_state.user_id,
+                    user_role="professor"
+                )
+                st.download_button(
+                    "Download iCal File",
+                    data=ical_data,
+                    file_name="professor_schedule.ics",
+                    mime="text/calendar"
+                )
 
-            with col2:
-                if st.button("Export to Google Calendar"):
-                    success, message = export_to_google_calendar(
-                        professor_schedule[0],  # Export first presentation
-                        None  # Add credentials handling
-                    )
-                    if success:
-                        st.success("Successfully exported to Google Calendar")
-                    else:
-                        st.error(f"Failed to export: {message}")
-        else:
-            st.info(f"No scheduled presentations found for professor {st.session_state.user_id}")
+        with col2:
+            if st.button("Export to Google Calendar"):
+                from calendar_integration import export_schedule_to_google_calendar
+                # Every presentation, in batched API calls
+                success, message = export_schedule_to_google_calendar(
+                    user_id=st.session_state.user_id,
+                    user_role="professor"
+                )
+                if success:
+                    st.success(f"Successfully exported to Google Calendar: {message}")
+                else:
+                    st.error(f"Failed to export: {message}")
     else:
-        st.info("Schedule has not been generated yet.")
+        st.info(f"No scheduled presentations found for professor {st.session_state.user_id}")
 
 def show_student_schedule():
     st.title(f"Student Schedule - {st.session_state.user_id}")
 
-    schedule_data = load_schedule_from_db()
-    if schedule_data is not None:
-        student_schedule = []
-        for item in schedule_data:
-            if str(item['student']).strip() == str(st.session_state.user_id).strip():
-                jury_dict = {j['role']: j['name'] for j in item['jury']}
-                student_schedule.append({
-                    'Date & Time': item['date'],
-                    'Topic': item['topic'],
-                    'Room': item['room'],
-                    'President': jury_dict['President'],
-                    'Rapporteur': jury_dict['Rapporteur'],
-                    'Supervisor': jury_dict['Supervisor']
-                })
-
-        if student_schedule:
-            df = pd.DataFrame(student_schedule)
-            st.dataframe(df, use_container_width=True)
+    # Indexed lookup of this student's rows only
+    student_schedule = load_student_schedule(st.session_state.user_id)
+    if student_schedule:
+        df = pd.DataFrame(student_schedule)
+        st.dataframe(df, use_container_width=True)
 
-            # Add calendar export options
-            st.subheader("Export Calendar")
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("Export to iCal"):
-                    ical_data = generate_ical_calendar(
-                        user_id=st.session_state.user_id,
-                        user_role="student"
-                    )
-                    st.download_button(
-                        "Download iCal File",
-                        data=ical_data,
-                        file_name="student_schedule.ics",
-                        mime="text/calendar"
-                    )
+        # Add calendar export options
+        st.subheader("Export Calendar")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Export to iCal"):
+                from calendar_integration import get_ical_calendar
+                ical_data = get_ical_calendar(
+                    user_id=st.session_state.user_id,
+                    user_role="student"
+                )
+                st.download_button(
+                    "Download iCal File",
+                    data=ical_data,
+                    file_name="student_schedule.ics",
+                    mime="text/calendar"
+                )
 
-            with col2:
-                if st.button("Export to Google Calendar"):
-                    success, message = export_to_google_calendar(
-                        student_schedule[0],  # Export first presentation
-                        None  # Add credentials handling
-                    )
-                    if success:
-                        st.success("Successfully exported to Google Calendar")
-                    else:
-                        st.error(f"Failed to export: {message}")
-        else:
-            st.info(f"No scheduled presentation found for student {st.session_state.user_id}")
+        with col2:
+            if st.button("Export to Google Calendar"):
+                from calendar_integration import export_schedule_to_google_calendar
+                # Every presentation, in batched API calls
+                success, message = export_schedule_to_google_calendar(
+                    user_id=st.session_state.user_id,
+                    user_role="student"
+                )
+                if success:
+                    st.success(f"Successfully exported to Google Calendar: {message}")
+                else:
+                    st.error(f"Failed to export: {message}")
     else:
-        st.info("Schedule has not been generated yet.")
+        st.info(f"No scheduled presentation found for student {st.session_state.user_id}")
+
+# Quick exports of the current schedule: format -> (file name, MIME type, writer)
+CURRENT_SCHEDULE_EXPORTS = {
+    'HTML': ('pfe_schedule.html', 'text/html', write_schedule_html),
+    'CSV': ('pfe_schedule.csv', 'text/csv', write_schedule_csv),
+    'TSV': (
+        'pfe_schedule.tsv',
+        'text/tab-separated-values',
+        lambda schedule, buffer: write_schedule_csv(schedule, buffer, delimiter='\t')
+    )
+}
+
+def clear_current_schedule_export():
+    # Stop resending the prepared file on later reruns
+    st.session_state.current_schedule_export = None
 
 def show_schedule_management():
     # Load existing schedule if available
     existing_schedule = load_schedule_from_db()
     if existing_schedule:
         st.subheader("Current Schedule")
-        formatted_schedule = []
-        for item in existing_schedule:
-            jury_dict = {j['role']: j['name'] for j in item['jury']}
-            formatted_schedule.append({
-                'Date & Time': item['date'],
-                'Topic': item['topic'],
-                'Student': item['student'],
-                'Room': item['room'],
-                'President': jury_dict['President'],
-                'Rapporteur': jury_dict['Rapporteur'],
-                'Supervisor': jury_dict['Supervisor']
-            })
-        current_schedule_df = pd.DataFrame(formatted_schedule)
-        st.dataframe(current_schedule_df, use_container_width=True)
+        show_paginated_table(
+            key="current_schedule",
+            table="active_schedules",
+            columns={
+                'date_time': 'Date & Time',
+                'topic': 'Topic',
+                'student': 'Student',
+                'room': 'Room',
+                'president': 'President',
+                'rapporteur': 'Rapporteur',
+                'supervisor': 'Supervisor'
+            },
+            sort_options={'Date & Time': 'date_time', 'Student': 'student', 'Room': 'room'},
+            search_columns=('topic', 'student', 'room', 'president', 'rapporteur', 'supervisor')
+        )
+
+        # Quick exports straight from the rows (no ReportLab build), built
+        # only on request and shared by all sessions until the next version
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            export_format = st.selectbox(
+                "Export format",
+                options=list(CURRENT_SCHEDULE_EXPORTS),
+                key="current_schedule_format"
+            )
+        with col2:
+            if st.button("Prepare Export", key="current_schedule_prepare"):
+                st.session_state.current_schedule_export = export_format
+
+        if st.session_state.current_schedule_export == export_format:
+            file_name, mime, write = CURRENT_SCHEDULE_EXPORTS[export_format]
+            data = schedule_cache.get(
+                ('export', export_format),
+                lambda: write(existing_schedule, io.StringIO()).getvalue()
+            )
+            st.download_button(
+                label=f"Download {export_format} Schedule",
+                data=data,
+                file_name=file_name,
+                mime=mime,
+                key="current_schedule_download",
+                on_click=clear_current_schedule_export
+            )
+
+    show_schedule_versions()
+    show_notification_progress()
+
+    # Room usage of the last generated schedule ("Toggle Room Usage")
+    if st.session_state.show_room_modal and st.session_state.room_occupancy is not None:
+        with st.expander("Room Usage", expanded=True):
+            display_room_occupancy(st.session_state.room_occupancy)
 
     # File upload
     uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
@@ -275,8 +226,11 @@ def show_schedule_management():
         # Read Excel file
         df = pd.read_excel(uploaded_file)
 
-        # Add department classification
-        df['Departement'] = df['codeSujet'].apply(classifier.classify_project)
+        # Classify once here; the result is persisted with the schedule
+        from project_classifier import classifier, topic_classifier
+        classified = classifier.classify_many_with_confidence(df['codeSujet'])
+        df['Departement'] = [department for department, _ in classified]
+        confidences = [confidence for _, confidence in classified]
 
         # Display data by department
         st.subheader("Projects by Department")
@@ -295,15 +249,23 @@ def show_schedule_management():
         st.dataframe(df)
 
         # Initialize scheduler
+        from pfescheduler import PFEScheduler
         scheduler = PFEScheduler()
 
         # Add presentations from Excel data
-        for _, row in df.iterrows():
-            scheduler.add_presentation(
-                topic=row['Sujet'],
-                student=f"{row['Nom']} {row['Prénom']}",
-                supervisor=row['Encadrant']
-            )
+        scheduler.add_presentations(
+            {
+                'topic': row['Sujet'],
+                'student': f"{row['Nom']} {row['Prénom']}",
+                'supervisor': row['Encadrant'],
+                'department': row['Departement'],
+                'classifier_version': classifier.version,
+                'confidence': confidence,
+                # Kept so the department can be recomputed from the code later
+                'subject_code': str(row['codeSujet'])
+            }
+            for (_, row), confidence in zip(df.iterrows(), confidences)
+        )
 
         # Date selection
         col1, col2 = st.columns(2)
@@ -406,7 +368,7 @@ def show_schedule_management():
                 schedule = scheduler.export_schedule()
 
                 # Store room usage in session state
-                st.session_state.room_usage = scheduler.get_room_usage()
+                st.session_state.room_occupancy = scheduler.get_occupancy_matrix()
 
                 # Format the schedule data for display and Excel export
                 formatted_schedule = []
@@ -419,14 +381,21 @@ def show_schedule_management():
                         'Room': item['room'],
                         'President': jury_dict['President'],
                         'Rapporteur': jury_dict['Rapporteur'],
-                        'Supervisor': jury_dict['Supervisor']
+                        'Supervisor': jury_dict['Supervisor'],
+                        'Department': item['department'],
+                        'Classifier Version': item['classifier_version'],
+                        'Confidence': item['confidence'],
+                        'Subject Code': item['subject_code']
                     })
 
                 # Save to database
-                save_schedule_to_db(formatted_schedule)
+                saved = save_schedule_to_db(formatted_schedule)
+
+                # Rows kept from earlier versions may carry an older classifier version
+                backfill_classifications(classifier, topic_classifier)
 
                 # Create DataFrame for display
-                schedule_df = pd.DataFrame(formatted_schedule)
+                schedule_df = pd.DataFrame(formatted_schedule).drop(columns=['Classifier Version', 'Confidence', 'Subject Code'])
 
                 # Display schedule
                 st.subheader("Generated Schedule")
@@ -437,7 +406,7 @@ def show_schedule_management():
                 scheduler.generate_pdf(pdf_buffer)
                 pdf_buffer.seek(0)
 
-                col1, col2, col3 = st.columns([1, 1, 1])
+                col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
                 with col1:
                     # Provide download button for PDF
                     st.download_button(
@@ -461,26 +430,87 @@ def show_schedule_management():
                     )
 
                 with col3:
+                    # Static HTML export, written straight from the rows
+                    st.download_button(
+                        label="Download HTML Schedule",
+                        data=scheduler.generate_html(io.StringIO()).getvalue(),
+                        file_name="pfe_schedule.html",
+                        mime="text/html"
+                    )
+
+                with col4:
+                    st.download_button(
+                        label="Download CSV Schedule",
+                        data=scheduler.generate_csv(io.StringIO()).getvalue(),
+                        file_name="pfe_schedule.csv",
+                        mime="text/csv"
+                    )
+
+                with col5:
                     # Room visualization button
                     st.button("Toggle Room Usage", on_click=toggle_room_modal)
 
-                # Send notifications
-                with st.spinner("Sending notifications..."):
-                    for schedule_item in formatted_schedule:
-                        recipients = [
-                            schedule_item['Student'],  # Add proper email addresses
-                            schedule_item['President'],
-                            schedule_item['Rapporteur'],
-                            schedule_item['Supervisor']
-                        ]
-                        send_schedule_notification(schedule_item, recipients)
+                # Queue notifications; the outbox worker sends them in the background
+                batch = f"schedule-{saved['version']}"
+                queued = enqueue_schedule_notifications(formatted_schedule, batch)
+                st.session_state.notification_batch = batch
 
                 # Success message
-                st.success("Schedule has been generated and notifications sent!")
+                st.success(f"Schedule has been generated and {queued} notifications queued!")
 
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
 
+def show_notification_progress():
+    batch = st.session_state.notification_batch
+    if not batch:
+        return
+
+    with st.expander("Notification Delivery", expanded=True):
+        progress = outbox_progress(batch)
+        total = sum(progress.values())
+        done = progress['sent'] + progress['dead']
+        st.progress(done / total if total else 1.0, text=f"{done}/{total} processed")
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Sent", progress['sent'])
+        col2.metric("Queued", progress['pending'])
+        col3.metric("Sending", progress['sending'])
+        col4.metric("Failed", progress['dead'])
+
+        if progress['dead']:
+            st.dataframe(pd.DataFrame(list_dead_letters(batch)), use_container_width=True)
+            if st.button("Retry Failed Notifications"):
+                retry_dead_letters(batch)
+                st.rerun()
+        if st.button("Refresh Delivery Status"):
+            st.rerun()
+
+def show_schedule_versions():
+    versions = list_schedule_versions()
+    if not versions:
+        return
+
+    with st.expander("Schedule Versions"):
+        versions_df = pd.DataFrame(versions)
+        st.dataframe(versions_df, use_container_width=True)
+
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selected_version = st.selectbox(
+                "Version",
+                options=[v['id'] for v in versions],
+                format_func=lambda v: f"Version {v}"
+            )
+        with col2:
+            if st.button("Activate Version"):
+                from calendar_integration import publish_ical_feeds
+                activate_schedule_version(selected_version)
+                # Republish so calendar clients take the rollback
+                publish_ical_feeds(selected_version)
+                st.success(f"Version {selected_version} is now the active schedule")
+                st.rerun()
+
 def show_admin_interface():
     st.title("PFE Schedule Manager")
 
@@ -499,6 +529,7 @@ def show_admin_interface():
         show_student_submissions()
 
     with tab3:
+        from analytics import display_analytics_dashboard
         display_analytics_dashboard()
 
     with tab4:
@@ -509,6 +540,7 @@ def show_student_submissions():
 
     if st.button("Generate New Student Form"):
         try:
+            from google_forms import create_student_form
             form_info = create_student_form()
             st.success(f"New form created successfully!")
             st.markdown(f"Form URL: {form_info['formUrl']}")
@@ -518,25 +550,90 @@ def show_student_submissions():
         except Exception as e:
             st.error(f"Error creating form: {str(e)}")
 
-    # Display submitted data
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute("""
-        SELECT * FROM student_submissions 
-        ORDER BY submission_date DESC
-    """)
+    # Display submitted data, one page at a time
+    st.subheader("Submitted Student Information")
+    shown = show_paginated_table(
+        key="submissions",
+        table="student_submissions",
+        columns={
+            'full_name': 'full_name',
+            'email': 'email',
+            'project_title': 'project_title',
+            'supervisor': 'supervisor',
+            'submission_date': 'submission_date'
+        },
+        sort_options={'Submission Date': 'submission_date', 'Name': 'full_name', 'Supervisor': 'supervisor'},
+        search_columns=('full_name', 'email', 'project_title', 'supervisor'),
+        descending=True
+    )
+    if not shown:
+        st.info("No student submissions yet.")
 
-    submissions = cur.fetchall()
-    cur.close()
-    conn.close()
+def _set_page_stack(state_key, pages):
+    st.session_state[state_key] = pages
+
+def show_paginated_table(key, table, columns, sort_options, search_columns,
+                         descending=False, page_size=25):
+    """Render one page of a table with keyset pagination done in SQL.
+
+    columns maps the selected database columns to display labels. Returns
+    the number of rows shown on the current page.
+    """
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        search = st.text_input("Filter", key=f"{key}_search")
+    with col2:
+        sort_label = st.selectbox("Sort by", list(sort_options), key=f"{key}_sort")
+    with col3:
+        descending = st.checkbox("Descending", value=descending, key=f"{key}_desc")
+
+    # Stack of keyset cursors, one per visited page; reset when the query changes
+    state_key = f"{key}_pages"
+    query = (search, sort_label, descending)
+    if st.session_state.get(f"{key}_query") != query:
+        st.session_state[f"{key}_query"] = query
+        st.session_state[state_key] = [None]
+    pages = st.session_state[state_key]
+
+    rows, next_after = fetch_keyset_page(
+        table,
+        list(columns),
+        order_by=sort_options[sort_label],
+        descending=descending,
+        after=pages[-1],
+        search=search,
+        search_columns=search_columns,
+        page_size=page_size
+    )
 
-    if submissions:
-        st.subheader("Submitted Student Information")
-        df = pd.DataFrame(submissions)
+    if rows:
+        df = pd.DataFrame(rows, columns=list(columns)).rename(columns=columns)
         st.dataframe(df, use_container_width=True)
-    else:
-        st.info("No student submissions yet.")
+
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    with nav1:
+        st.button(
+            "Previous",
+            key=f"{key}_prev",
+            disabled=len(pages) == 1,
+            on_click=_set_page_stack,
+            args=(state_key, pages[:-1])
+        )
+    with nav2:
+        st.button(
+            "Next",
+            key=f"{key}_next",
+            disabled=next_after is None,
+            on_click=_set_page_stack,
+            args=(state_key, pages + [next_after])
+        )
+    with nav3:
+        caption = f"Page {len(pages)}"
+        if st.checkbox("Show estimated total", key=f"{key}_count"):
+            caption += f" of about {estimate_row_count(table, search, search_columns)} rows"
+        st.caption(caption)
+
+    return len(rows)
 
 def toggle_room_modal():
     st.session_state.show_room_modal = not st.session_state.show_room_modal
@@ -572,8 +669,12 @@ if 'constraints' not in st.session_state:
     st.session_state.constraints = {}
 if 'show_room_modal' not in st.session_state:
     st.session_state.show_room_modal = False
-if 'room_usage' not in st.session_state:
-    st.session_state.room_usage = None
+if 'room_occupancy' not in st.session_state:
+    st.session_state.room_occupancy = None
+if 'notification_batch' not in st.session_state:
+    st.session_state.notification_batch = None
+if 'current_schedule_export' not in st.session_state:
+    st.session_state.current_schedule_export = None
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 if 'user_role' not in st.session_state:
@@ -581,27 +682,31 @@ if 'user_role' not in st.session_state:
 if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 
-# Initialize database
-try:
-    init_database()
-except Exception as e:
-    st.error(f"Database initialization error: {str(e)}")
-
-# Main app logic
-if not st.session_state.logged_in:
-    login()
-else:
-    # Add logout button
-    if st.sidebar.button("Logout"):
-        st.session_state.logged_in = False
-        st.session_state.user_role = None
-        st.session_state.user_id = None
-        st.experimental_rerun()
-
-    # Show appropriate interface based on user role
-    if st.session_state.user_role == "admin":
-        show_admin_interface()
-    elif st.session_state.user_role == "professor":
-        show_professor_schedule()
-    elif st.session_state.user_role == "student":
-        show_student_schedule()
\ No newline at end of file
+# One pooled database connection is shared by the whole rerun
+with rerun_scope():
+    # Initialize database
+    try:
+        init_database()
+        # Sends queued notifications in the background (once per process)
+        start_outbox_worker()
+    except Exception as e:
+        st.error(f"Database initialization error: {str(e)}")
+
+    # Main app logic
+    if not st.session_state.logged_in:
+        login()
+    else:
+        # Add logout button
+        if st.sidebar.button("Logout"):
+            st.session_state.logged_in = False
+            st.session_state.user_role = None
+            st.session_state.user_id = None
+            st.experimental_rerun()
+
+        # Show appropriate interface based on user role
+        if st.session_state.user_role == "admin":
+            show_admin_interface()
+        elif st.session_state.user_role == "professor":
+            show_professor_schedule()
+        elif st.session_state.user_role == "student":
+            show_student_schedule()
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""Small performance checks, run with: python benchmarks.py <name>"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+def make_schedule_rows(count):
+    """Build synthetic export_schedule() rows"""
+    start = datetime(2024, 6, 1, 9, 0)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'date': (start + timedelta(hours=i % 8, days=i // 8)).strftime('%Y-%m-%d %H:%M'),
+            'topic': f"Projet <{i}> & analyse \"temps reel\"",
+            'student': f"Etudiant {i}",
+            'room': f"K{i % 21 + 1:02d}",
+            'jury': [
+                {'role': 'President', 'name': f"Prof {i % 37}"},
+                {'role': 'Rapporteur', 'name': f"Prof {(i + 11) % 37}"},
+                {'role': 'Supervisor', 'name': f"Prof {(i + 23) % 37}"}
+            ],
+            'department': 'Informatique'
+        })
+    return rows
+
+def bench_exports(args):
+    from schedule_export import write_schedule_csv, write_schedule_html
+
+    rows = make_schedule_rows(args.rows)
+    failed = False
+    for name, write in [
+        ('html', lambda buf: write_schedule_html(rows, buf)),
+        ('csv', lambda buf: write_schedule_csv(rows, buf)),
+        ('tsv', lambda buf: write_schedule_csv(rows, buf, delimiter='\t')),
+    ]:
+        start = time.perf_counter()
+        size = len(write(io.StringIO()).getvalue())
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {args.rows} rows in {elapsed * 1000:.1f} ms ({size} chars)")
+        if elapsed > args.budget:
+            print(f"  over budget ({args.budget:.2f} s)")
+            failed = True
+    return 1 if failed else 0
+
+def make_subject_codes(count):
+    """Build synthetic codeSujet values (a few match no department)"""
+    prefixes = ['MI', 'ISI', 'INFO', 'ENG', 'ELEC', 'PROD', 'MEC', 'BAT', 'GC', 'MA', 'CPI', 'DI', 'XYZ']
+    return [f"L-{prefixes[i % len(prefixes)]}{23 + i % 3}-{i:03d}" for i in range(count)]
+
+def bench_classifier(args):
+    from project_classifier import classifier
+    import logging
+    logging.disable(logging.INFO)
+
+    codes = make_subject_codes(args.codes)
+    failed = False
+
+    start = time.perf_counter()
+    for code in codes:
+        classifier.extract_dept_code(code)
+    per_code = (time.perf_counter() - start) / len(codes) * 1e6
+    print(f"extract_dept_code: {per_code:.2f} us per code ({len(codes)} codes)")
+    if per_code > args.budget:
+        print(f"  over budget ({args.budget:.1f} us)")
+        failed = True
+
+    classifier.classify_many(['warm-up'])  # load or train the ML fallback first
+    start = time.perf_counter()
+    classifier.classify_many(codes)
+    elapsed = time.perf_counter() - start
+    print(f"classify_many: {elapsed * 1000:.1f} ms for {len(codes)} codes "
+          f"({elapsed / len(codes) * 1e6:.2f} us per code)")
+
+    start = time.perf_counter()
+    classifier.classify_many(codes)
+    elapsed = time.perf_counter() - start
+    print(f"classify_many (repeat): {elapsed * 1000:.1f} ms ({elapsed / len(codes) * 1e6:.2f} us per code)")
+
+    # Only codes no pattern matches reach the ML fallback and its cache
+    stats = classifier.cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    print(f"ML result cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hits'] / lookups if lookups else 0:.0%} hit rate), {stats['size']}/{stats['maxsize']} entries")
+    return 1 if failed else 0
+
+# Modules that must not be imported while rendering the login page
+# (streamlit itself imports plotly's lazy graph_objects stub, so only
+# plotly.express is listed)
+LAZY_MODULES = [
+    'reportlab', 'qrcode', 'sklearn', 'googleapiclient',
+    'google_auth_oauthlib', 'plotly.express', 'icalendar',
+    'pfescheduler', 'project_classifier', 'calendar_integration',
+    'google_forms', 'analytics'
+]
+
+def measure_import(module, env=None):
+    """Import a module in a fresh interpreter under -X importtime.
+
+    Returns (cumulative microseconds of the module, set of imported module names).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    total = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            total = int(cumulative)
+    if total is None:
+        raise RuntimeError(f"Could not import {module}:\n{result.stderr[-2000:]}")
+    return total, imported
+
+def bench_imports(args):
+    env = dict(os.environ)
+    # Point the database at a closed local port so init_database fails fast
+    env.update({'PGHOST': '127.0.0.1', 'PGPORT': '1'})
+
+    failed = False
+    runs = []
+    for _ in range(args.repeat):
+        total, imported = measure_import(args.module, env)
+        runs.append(total)
+    best = min(runs)
+    print(f"import {args.module}: best of {args.repeat} = {best / 1000:.0f} ms")
+
+    eager = sorted(
+        lazy for lazy in LAZY_MODULES
+        if any(name == lazy or name.startswith(lazy + '.') for name in imported)
+    )
+    if eager:
+        print(f"  eagerly imported: {', '.join(eager)}")
+        failed = True
+    if best > args.budget * 1000:
+        print(f"  over budget ({args.budget:.0f} ms)")
+        failed = True
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    exports = subparsers.add_parser('exports', help="HTML/CSV schedule export speed")
+    exports.add_argument('--rows', type=int, default=10000)
+    exports.add_argument('--budget', type=float, default=0.5, help="seconds per format")
+    exports.set_defaults(func=bench_exports)
+
+    classify = subparsers.add_parser('classifier', help="per-code cost of department pattern matching")
+    classify.add_argument('--codes', type=int, default=10000)
+    classify.add_argument('--budget', type=float, default=10, help="microseconds per code")
+    classify.set_defaults(func=bench_classifier)
+
+    imports = subparsers.add_parser('imports', help="cold start import time (python -X importtime)")
+    imports.add_argument('--module', default='app')
+    imports.add_argument('--repeat', type=int, default=3)
+    imports.add_argument('--budget', type=float, default=2000, help="milliseconds")
+    imports.set_defaults(func=bench_imports)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,25 @@
 from icalendar import Calendar, Event
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pytz
-import os
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+import httplib2
 from dotenv import load_dotenv
+from collections import defaultdict
+import argparse
+import hashlib
 import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from db import get_cursor, copy_rows, in_clause, iter_row_chunks
+from schedule_store import IN_BATCH_SIZE, get_active_version, lookup_name, schedule_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,98 +31,496 @@ load_dotenv()
 # Google Calendar API scopes
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
-def get_db_connection():
-    """Get database connection using environment variables"""
-    return psycopg2.connect(
-        host=os.getenv("PGHOST","aws-0-eu-central-1.pooler.supabase.com"),
-        database=os.getenv("PGDATABASE","postgres"),
-        user=os.getenv("PGUSER","postgres.lvonpafzqjfxqenzvjth"),
-        password=os.getenv("PGPASSWORD","trtrtr123"),
-        port=os.getenv("PGPORT","5432")
-    )
+# OAuth client secrets and the cached user token
+GOOGLE_CLIENT_SECRETS = os.getenv("GOOGLE_CLIENT_SECRETS", "credentials.json")
+GOOGLE_TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE", "token.json")
 
-def generate_ical_calendar(user_id, user_role="student"):
-    """Generate iCal format calendar for a specific user"""
+# API and batch endpoints (override both to test against a local server)
+GOOGLE_API_ENDPOINT = os.getenv("GOOGLE_API_ENDPOINT")
+GOOGLE_BATCH_URI = os.getenv("GOOGLE_BATCH_URI", "https://www.googleapis.com/batch/calendar/v3")
+
+# Calendar API batches hold at most 50 requests
+GOOGLE_BATCH_SIZE = 50
+GOOGLE_EXPORT_RETRIES = int(os.getenv("GOOGLE_EXPORT_RETRIES", "5"))
+GOOGLE_BACKOFF_SECONDS = float(os.getenv("GOOGLE_BACKOFF_SECONDS", "1"))
+GOOGLE_TIME_ZONE = 'Africa/Tunis'
+
+# Credentials and service shared by all exports of this process
+_google = {'credentials': None, 'service': None}
+_google_lock = threading.Lock()
+
+# Published feeds: ICAL_CACHE_DIR/feeds/<etag>.ics holds the calendar bytes;
+# the ical_feeds table maps each participant of a version to an etag
+ICAL_CACHE_DIR = os.getenv("ICAL_CACHE_DIR", os.path.join("artifacts", "ical"))
+
+# Bump when _build_calendar's output changes, so stored feeds get rebuilt
+ICAL_FEED_FORMAT = 2
+
+# Right-hand side of the event UIDs
+ICAL_UID_DOMAIN = os.getenv("ICAL_UID_DOMAIN", "pfe-schedule-manager")
+
+# Row fields _build_calendar renders; together they determine a feed's bytes
+ICAL_EVENT_FIELDS = ('id', 'presentation_key', 'event_sequence', 'created_at', 'date_time', 'student',
+                     'topic', 'room', 'president', 'rapporteur', 'supervisor')
+
+# Marker participant of a version whose feeds were published
+PUBLISHED_MARKER = ''
+
+def _build_calendar(presentations):
+    """iCal bytes for schedules view rows (dicts), in the given order"""
+    cal = Calendar()
+    cal.add('prodid', '-//PFE Schedule Manager//EN')
+    cal.add('version', '2.0')
+
+    for presentation in presentations:
+        event = Event()
+
+        # Same UID in every schedule version, so clients update the event in
+        # place; SEQUENCE only moves when its time, room or jury changed
+        event.add('uid', f"{presentation['presentation_key'] or presentation['id']}@{ICAL_UID_DOMAIN}")
+        event.add('sequence', presentation['event_sequence'] or 0)
+        if presentation['created_at']:
+            # When this revision was first published (or saved, if never)
+            modified = pytz.utc.localize(presentation['created_at'])
+            event.add('dtstamp', modified)
+            event.add('last-modified', modified)
+
+        # Set event details
+        event.add('summary', f"PFE Presentation: {presentation['student']}")
+        event.add('dtstart', presentation['date_time'])
+        event.add('dtend', presentation['date_time'] + timedelta(hours=1))
+        event.add('location', presentation['room'])
+
+        # Add description with all details
+        description = f"""
+        Student: {presentation['student']}
+        Topic: {presentation['topic']}
+        Room: {presentation['room']}
+        Jury:
+        - President: {presentation['president']}
+        - Rapporteur: {presentation['rapporteur']}
+        - Supervisor: {presentation['supervisor']}
+        """
+        event.add('description', description)
+
+        # Add to calendar
+        cal.add_component(event)
+
+    return cal.to_ical()
+
+def _feed_etag(presentations):
+    """Entity tag of a feed: a hash of the content it renders, so feed files
+    never depend on ids or versions of a particular database"""
+    digest = hashlib.sha1(f"{ICAL_FEED_FORMAT}:{ICAL_UID_DOMAIN}".encode('utf-8'))
+    for presentation in presentations:
+        digest.update(b'\x1e')
+        digest.update('\x1f'.join(str(presentation[field]) for field in ICAL_EVENT_FIELDS).encode('utf-8'))
+    return digest.hexdigest()
+
+EMPTY_FEED_ETAG = _feed_etag([])
+
+def _feed_file(etag):
+    return os.path.join(ICAL_CACHE_DIR, 'feeds', f"{etag}.ics")
+
+def _write_atomic(path, data):
+    # Readers see either no file or the complete one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _store_feed(etag, presentations):
+    """Build and write a feed unless a file with this etag exists (1 if written).
+
+    The etag hashes the rendered content, so an existing file always holds
+    the same bytes.
+    """
+    if os.path.exists(_feed_file(etag)):
+        return 0
+    _write_atomic(_feed_file(etag), _build_calendar(presentations))
+    return 1
+
+def _version_presentations(version):
+    """Rows of one schedule version as dicts, ordered by date_time"""
+    for columns, rows in iter_row_chunks("""
+        SELECT id, date_time, topic, student, room, president, rapporteur, supervisor,
+               presentation_key, event_sequence, created_at, event_hash
+        FROM schedules
+        WHERE valid_from <= %s AND (valid_to IS NULL OR valid_to > %s)
+        ORDER BY date_time, id
+    """, (version, version)):
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def _published_events(cur, keys):
+    """Last published (row id, event hash, sequence, modified at) per presentation key"""
+    published = {}
+    for start in range(0, len(keys), IN_BATCH_SIZE):
+        clause, params = in_clause('presentation_key', keys[start:start + IN_BATCH_SIZE])
+        cur.execute(f"""
+            SELECT presentation_key, presentation_id, event_hash, sequence, modified_at
+            FROM ical_events WHERE {clause}
+        """, params)
+        published.update((key, tuple(revision)) for key, *revision in cur.fetchall())
+    return published
+
+def _apply_published(presentations, published):
+    """Render rows with their published SEQUENCE and LAST-MODIFIED"""
+    for presentation in presentations:
+        revision = published.get(presentation['presentation_key'])
+        if revision is not None and revision[0] == presentation['id']:
+            presentation['event_sequence'], presentation['created_at'] = revision[2:]
+
+def _publish_events(cur, presentations):
+    """Record the revision of every event published now.
+
+    An event whose row differs from the last published one gets a new
+    LAST-MODIFIED, and SEQUENCE (highest published) + 1 if its time, room
+    or jury moved, so clients also take a rollback to an older version.
+    """
+    published = _published_events(cur, [p['presentation_key'] for p in presentations if p['presentation_key']])
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    updates = []
+    for presentation in presentations:
+        key = presentation['presentation_key']
+        revision = published.get(key)
+        if not key or (revision is not None and revision[0] == presentation['id']):
+            continue
+        if revision is None:
+            # First publication: the sequence and time the row was saved with
+            sequence, modified = presentation['event_sequence'] or 0, presentation['created_at'] or now
+        else:
+            moved = revision[1] != presentation['event_hash']
+            sequence, modified = revision[2] + 1 if moved else revision[2], now
+        published[key] = (presentation['id'], presentation['event_hash'], sequence, modified)
+        updates.append((key, *published[key]))
+    cur.executemany("""
+        INSERT INTO ical_events (presentation_key, presentation_id, event_hash, sequence, modified_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (presentation_key) DO UPDATE
+        SET presentation_id = excluded.presentation_id, event_hash = excluded.event_hash,
+            sequence = excluded.sequence, modified_at = excluded.modified_at
+    """, updates)
+    _apply_published(presentations, published)
+
+def publish_ical_feeds(version=None):
+    """Publish the .ics feed of every student and professor of a version.
+
+    The schedule is read once and grouped in memory. Each feed is stored
+    under its etag, so a participant whose presentations did not change
+    since an earlier version reuses that file instead of rebuilding it.
+    Publishing replaces the feeds of any other version; call it again when
+    an older version is reactivated. Returns the number of feed files written.
+    """
+    if version is None:
+        version = get_active_version()
+
+    presentations = list(_version_presentations(version))
+    os.makedirs(os.path.dirname(_feed_file(EMPTY_FEED_ETAG)), exist_ok=True)
+
+    with get_cursor() as cur:
+        # Serialize concurrent publishers on the pointer row
+        cur.execute("UPDATE schedule_active SET version_id = version_id")
+        _publish_events(cur, presentations)
+
+        feeds = defaultdict(list)
+        for presentation in presentations:
+            feeds[('student', lookup_name(presentation['student']))].append(presentation)
+            # A professor holding two roles in one presentation gets one event
+            for name in {lookup_name(presentation[role]) for role in ('president', 'rapporteur', 'supervisor')
+                         if presentation[role]}:
+                feeds[('professor', name)].append(presentation)
+
+        index = {PUBLISHED_MARKER: EMPTY_FEED_ETAG}
+        written = _store_feed(EMPTY_FEED_ETAG, [])
+        for (user_role, name), participant_presentations in feeds.items():
+            etag = _feed_etag(participant_presentations)
+            index[f"{user_role}:{name}"] = etag
+            written += _store_feed(etag, participant_presentations)
+
+        # Files first, then the index that points readers at them
+        cur.execute("DELETE FROM ical_feeds")
+        copy_rows(cur, 'ical_feeds', ('version_id', 'participant', 'etag'),
+                  ((version, participant, etag) for participant, etag in index.items()))
+
+    logger.info(f"Published {len(index) - 1} iCal feeds for schedule version {version} ({written} rebuilt)")
+    return written
+
+def _feed_etag_for(version, participant):
+    """Etag of a participant's published feed, or None if the version has none"""
+    with get_cursor() as cur:
+        cur.execute(
+            "SELECT participant, etag FROM ical_feeds WHERE version_id = %s AND participant IN (%s, %s)",
+            (version, PUBLISHED_MARKER, participant)
+        )
+        etags = dict(cur.fetchall())
+    if PUBLISHED_MARKER not in etags:
+        return None
+    return etags.get(participant, EMPTY_FEED_ETAG)
 
-        # Query based on user role
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/').strip('"') == etag for tag in if_none_match.split(','))
+
+def get_ical_feed(user_id, user_role="student", if_none_match=None):
+    """Conditional read of a user's feed for the active schedule version.
+
+    Returns (status, etag, body) with HTTP semantics: 304 and no body when
+    if_none_match already names the feed's etag, otherwise 200 and the
+    .ics bytes. A user without presentations gets the empty calendar.
+    """
+    version = schedule_cache.current_version()
+    participant = f"{user_role}:{lookup_name(user_id)}"
+    etag = _feed_etag_for(version, participant)
+    if etag is None:
+        # The cached version may be outdated; only publish the active one
+        version = get_active_version()
+        schedule_cache.set_version(version)
+        etag = _feed_etag_for(version, participant)
+    # Versions saved before feeds were published, or a wiped cache dir
+    if etag is None or not os.path.exists(_feed_file(etag)):
+        publish_ical_feeds(version)
+        etag = _feed_etag_for(version, participant)
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return 304, etag, None
+    with open(_feed_file(etag), 'rb') as f:
+        return 200, etag, f.read()
+
+def get_ical_calendar(user_id, user_role="student"):
+    """iCal bytes of a user's active schedule, read from the published feeds"""
+    return get_ical_feed(user_id, user_role)[2]
+
+def ical_feed_app(environ, start_response):
+    """WSGI endpoint for calendar subscriptions: GET /<role>/<name>.ics
+
+    Clients sending If-None-Match with the last ETag get 304 Not Modified
+    while their feed is unchanged.
+    """
+    # WSGI passes the decoded path as latin-1; names may be UTF-8
+    path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8', 'replace')
+    parts = path.strip('/').split('/')
+    if (environ.get('REQUEST_METHOD') not in ('GET', 'HEAD') or len(parts) != 2
+            or parts[0] not in ('student', 'professor') or not parts[1].endswith('.ics')):
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not found']
+
+    status, etag, body = get_ical_feed(parts[1][:-len('.ics')], parts[0], environ.get('HTTP_IF_NONE_MATCH'))
+    headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')]
+    if status == 304:
+        start_response('304 Not Modified', headers)
+        return []
+    headers += [('Content-Type', 'text/calendar; charset=utf-8'), ('Content-Length', str(len(body)))]
+    start_response('200 OK', headers)
+    return [] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+def _user_presentations(user_id, user_role="student"):
+    """Active schedule rows (dicts) of a student or jury member, by date_time"""
+    with get_cursor(dict_rows=True) as cur:
+        # Query based on user role (keys computed with lookup_name)
+        name = lookup_name(user_id)
         if user_role == "student":
             cur.execute("""
-                SELECT * FROM schedules 
-                WHERE student = %s
-                ORDER BY date_time
-            """, (user_id,))
-        else:  # professor
+                SELECT * FROM active_schedules 
+                WHERE student_key = %s
+                ORDER BY date_time, id
+            """, (name,))
+        else:  # professor, through the jury_assignments index
             cur.execute("""
-                SELECT * FROM schedules 
-                WHERE president = %s 
-                OR rapporteur = %s 
-                OR supervisor = %s
-                ORDER BY date_time
-            """, (user_id, user_id, user_id))
+                SELECT * FROM active_schedules 
+                WHERE id IN (
+                    SELECT j.presentation_id
+                    FROM professors pr
+                    JOIN jury_assignments j ON j.professor_id = pr.id
+                    WHERE pr.name_key = %s
+                )
+                ORDER BY date_time, id
+            """, (name,))
 
         presentations = cur.fetchall()
+    return presentations
+
+def generate_ical_calendar(user_id, user_role="student"):
+    """Generate iCal format calendar for a specific user"""
+    try:
+        presentations = _user_presentations(user_id, user_role)
+        with get_cursor() as cur:
+            _apply_published(presentations, _published_events(
+                cur, [p['presentation_key'] for p in presentations if p['presentation_key']]))
+        return _build_calendar(presentations)
 
-        # Create calendar
-        cal = Calendar()
-        cal.add('prodid', '-//PFE Schedule Manager//EN')
-        cal.add('version', '2.0')
+    except Exception as e:
+        logger.error(f"Error generating iCal calendar: {str(e)}")
+        raise
 
-        for presentation in presentations:
-            event = Event()
+def _google_credentials(credentials=None):
+    """Authorized credentials, loaded once and reused by every export.
 
-            # Set event details
-            event.add('summary', f"PFE Presentation: {presentation['student']}")
-            event.add('dtstart', presentation['date_time'])
-            event.add('dtend', presentation['date_time'] + timedelta(hours=1))
-            event.add('location', presentation['room'])
+    credentials may be authorized user info (dict) or a google.auth
+    credentials object; otherwise the process-wide ones are used, then
+    GOOGLE_TOKEN_FILE, and only as a last resort the interactive consent
+    flow. Refreshed or newly granted tokens are written back to the file.
+    """
+    if credentials is not None and not isinstance(credentials, dict):
+        return credentials
 
-            # Add description with all details
-            description = f"""
-            Student: {presentation['student']}
+    creds = _google['credentials']
+    if credentials:
+        creds = Credentials.from_authorized_user_info(credentials, SCOPES)
+    elif creds is None and os.path.exists(GOOGLE_TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(GOOGLE_TOKEN_FILE, SCOPES)
+
+    # If credentials invalid or don't exist, prompt for new ones
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                GOOGLE_CLIENT_SECRETS, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(GOOGLE_TOKEN_FILE, 'w') as token:
+            token.write(creds.to_json())
+    return creds
+
+def _google_service(credentials=None):
+    """Calendar API service, built once per set of credentials"""
+    with _google_lock:
+        creds = _google_credentials(credentials)
+        if _google['service'] is None or _google['credentials'] is not creds:
+            client_options = {'api_endpoint': GOOGLE_API_ENDPOINT} if GOOGLE_API_ENDPOINT else None
+            # The bundled discovery document avoids a network round-trip
+            _google['service'] = build('calendar', 'v3', credentials=creds,
+                                       client_options=client_options, static_discovery=True)
+            _google['credentials'] = creds
+        return _google['service']
+
+def _retryable(error):
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 403:
+            return any(reason in error.content for reason in (b'rateLimitExceeded', b'userRateLimitExceeded'))
+        return status in (429, 500, 502, 503, 504)
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def _google_event(presentation):
+    """Calendar API event body for a schedules view row"""
+    return {
+        # Hex presentation keys are valid event ids, so re-exports update
+        # the same event instead of adding a copy
+        'id': presentation['presentation_key'],
+        'status': 'confirmed',
+        'summary': f"PFE Presentation: {presentation['student']}",
+        'location': presentation['room'],
+        'description': f"""
             Topic: {presentation['topic']}
+            Student: {presentation['student']}
             Room: {presentation['room']}
-            Jury:
-            - President: {presentation['president']}
-            - Rapporteur: {presentation['rapporteur']}
-            - Supervisor: {presentation['supervisor']}
-            """
-            event.add('description', description)
+            President: {presentation['president']}
+            Rapporteur: {presentation['rapporteur']}
+            Supervisor: {presentation['supervisor']}
+            """,
+        'start': {
+            'dateTime': presentation['date_time'].isoformat(),
+            'timeZone': GOOGLE_TIME_ZONE,
+        },
+        'end': {
+            'dateTime': (presentation['date_time'] + timedelta(hours=1)).isoformat(),
+            'timeZone': GOOGLE_TIME_ZONE,
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'popup', 'minutes': 60},
+            ],
+        },
+    }
 
-            # Add to calendar
-            cal.add_component(event)
+def _execute_batch(service, calendar_id, requests):
+    """Send (operation, event) requests keyed by event id as batch calls.
 
-        cur.close()
-        conn.close()
+    Returns {event id: exception or None}.
+    """
+    results = {}
+    items = list(requests.items())
+    for start in range(0, len(items), GOOGLE_BATCH_SIZE):
+        chunk = items[start:start + GOOGLE_BATCH_SIZE]
 
-        return cal.to_ical()
+        def callback(request_id, response, exception):
+            results[request_id] = exception
 
-    except Exception as e:
-        logger.error(f"Error generating iCal calendar: {str(e)}")
-        raise
+        batch = BatchHttpRequest(callback=callback, batch_uri=GOOGLE_BATCH_URI)
+        for event_id, (operation, body) in chunk:
+            if operation == 'insert':
+                request = service.events().insert(calendarId=calendar_id, body=body)
+            else:
+                request = service.events().update(calendarId=calendar_id, eventId=event_id, body=body)
+            batch.add(request, request_id=event_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            # The whole round-trip failed: every request of the chunk gets the error
+            for event_id, _ in chunk:
+                results.setdefault(event_id, e)
+    return results
 
-def export_to_google_calendar(presentation_data, credentials=None):
-    """Export a presentation to Google Calendar"""
+def export_schedule_to_google_calendar(user_id, user_role="student", credentials=None, calendar_id='primary'):
+    """Export all of a user's presentations to Google Calendar.
+
+    Events are sent through the API's batch endpoint (GOOGLE_BATCH_SIZE per
+    round-trip) with one cached service. Events that already exist are
+    updated; rate-limited or failed requests are retried with exponential
+    backoff up to GOOGLE_EXPORT_RETRIES times. Returns (success, message).
+    """
     try:
-        creds = None
+        presentations = _user_presentations(user_id, user_role)
+        if not presentations:
+            return True, "No presentations to export"
 
-        # Check if we have valid credentials
-        if credentials:
-            creds = Credentials.from_authorized_user_info(credentials, SCOPES)
+        service = _google_service(credentials)
+        pending = {p['presentation_key']: ('insert', _google_event(p)) for p in presentations}
+        failed = {}
+        for attempt in range(GOOGLE_EXPORT_RETRIES + 1):
+            retry = {}
+            delay = False
+            for event_id, error in _execute_batch(service, calendar_id, pending).items():
+                operation, body = pending[event_id]
+                if error is None:
+                    continue
+                if isinstance(error, HttpError) and error.resp.status == 409 and operation == 'insert':
+                    # Exported before: update that event in the next round
+                    retry[event_id] = ('update', body)
+                elif _retryable(error):
+                    retry[event_id] = (operation, body)
+                    delay = True
+                else:
+                    failed[event_id] = error
+            pending = retry
+            if not pending or attempt == GOOGLE_EXPORT_RETRIES:
+                break
+            if delay:
+                time.sleep(GOOGLE_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random()))
+        failed.update((event_id, 'retries exhausted') for event_id in pending)
 
-        # If credentials invalid or don't exist, prompt for new ones
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
+        exported = len(presentations) - len(failed)
+        logger.info(f"Exported {exported}/{len(presentations)} presentations of {user_id} to Google Calendar")
+        if failed:
+            return False, f"{len(failed)} of {len(presentations)} events failed: {next(iter(failed.values()))}"
+        return True, f"Exported {exported} presentations"
 
-        # Build Google Calendar service
-        service = build('calendar', 'v3', credentials=creds)
+    except Exception as e:
+        logger.error(f"Error exporting to Google Calendar: {str(e)}")
+        return False, str(e)
+
+def export_to_google_calendar(presentation_data, credentials=None):
+    """Export a presentation to Google Calendar"""
+    try:
+        service = _google_service(credentials)
 
         # Create event
         event = {
@@ -151,4 +559,15 @@ def export_to_google_calendar(presentation_data, credentials=None):
 
     except Exception as e:
         logger.error(f"Error exporting to Google Calendar: {str(e)}")
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
+
+if __name__ == "__main__":
+    from wsgiref.simple_server import make_server
+
+    parser = argparse.ArgumentParser(description="Serve the published iCal feeds")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    logger.info(f"Serving iCal feeds on http://{args.host}:{args.port}/<student|professor>/<name>.ics")
+    make_server(args.host, args.port, ical_feed_app).serve_forever()
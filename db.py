@@ -0,0 +1,610 @@
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+import itertools
+from contextlib import contextmanager
+from datetime import date, datetime
+import pandas as pd
+from psycopg2 import pool
+from psycopg2.extensions import cursor as _BaseCursor
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Storage backend: "postgres" (default) or "sqlite" for single-node/offline runs
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "pfe_schedule.db")
+
+# Database configuration (host and credentials come from the environment only)
+DB_HOST = os.getenv("PGHOST")
+DB_NAME = os.getenv("PGDATABASE", "postgres")
+DB_USER = os.getenv("PGUSER")
+DB_PASSWORD = os.getenv("PGPASSWORD")
+DB_PORT = os.getenv("PGPORT", "5432")
+
+# Pool sizing
+POOL_MIN_CONN = int(os.getenv("PGPOOL_MIN", "1"))
+POOL_MAX_CONN = int(os.getenv("PGPOOL_MAX", "10"))
+
+# Seconds to wait for a free pooled connection before giving up (a rerun
+# holds its connection until it finishes)
+POOL_TIMEOUT = float(os.getenv("PGPOOL_TIMEOUT", "30"))
+
+# Rows per round-trip when streaming large reads
+FETCH_CHUNK_SIZE = int(os.getenv("DB_FETCH_CHUNK_SIZE", "2000"))
+
+
+class DBMetrics:
+    """Process-wide counters for pool wait time and query count"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.connections_opened = 0
+            self.pool_wait_total = 0.0
+            self.pool_wait_max = 0.0
+            self.query_count = 0
+            self.query_time = 0.0
+
+    def record_checkout(self, wait):
+        with self.lock:
+            self.checkouts += 1
+            self.pool_wait_total += wait
+            self.pool_wait_max = max(self.pool_wait_max, wait)
+
+    def record_connect(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def record_query(self, elapsed):
+        with self.lock:
+            self.query_count += 1
+            self.query_time += elapsed
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'connections_opened': self.connections_opened,
+                'pool_wait_total': self.pool_wait_total,
+                'pool_wait_max': self.pool_wait_max,
+                'query_count': self.query_count,
+                'query_time': self.query_time
+            }
+
+metrics = DBMetrics()
+
+
+class PoolExhaustedError(RuntimeError):
+    """No pooled connection became free within POOL_TIMEOUT"""
+
+def _acquire_slot(slots, maxconn):
+    if not slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolExhaustedError(
+            f"Database pool exhausted: all {maxconn} connections stayed in use for {POOL_TIMEOUT:g}s "
+            "(raise PGPOOL_MAX or PGPOOL_TIMEOUT)"
+        )
+
+
+# --- PostgreSQL -------------------------------------------------------------
+
+class _MeteredCursorMixin:
+    """Count every statement sent through a cursor"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.record_query(time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.record_query(time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            metrics.record_query(time.perf_counter() - start)
+
+class MeteredCursor(_MeteredCursorMixin, _BaseCursor):
+    pass
+
+class MeteredDictCursor(_MeteredCursorMixin, RealDictCursor):
+    pass
+
+
+class _CountingConnectionPool(pool.ThreadedConnectionPool):
+    def _connect(self, key=None):
+        metrics.record_connect()
+        return super()._connect(key)
+
+class BlockingConnectionPool:
+    """ThreadedConnectionPool that waits (up to POOL_TIMEOUT) for a free connection instead of failing"""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self._pool = _CountingConnectionPool(minconn, maxconn, **kwargs)
+        self._maxconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self):
+        start = time.perf_counter()
+        _acquire_slot(self._slots, self._maxconn)
+        try:
+            conn = self._pool.getconn()
+            if conn.closed:
+                # Server closed the connection while it was idle
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        metrics.record_checkout(time.perf_counter() - start)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+def _copy_value(value):
+    """Encode one value for COPY ... FROM STDIN text format"""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+_stream_ids = itertools.count(1)
+
+class PostgresBackend:
+    name = 'postgres'
+
+    def __init__(self):
+        # An empty PGPASSWORD is allowed (trust/peer auth), an unset one is not
+        missing = [var for var, value in (("PGHOST", DB_HOST), ("PGUSER", DB_USER), ("PGPASSWORD", DB_PASSWORD))
+                   if value is None]
+        if missing:
+            raise RuntimeError(
+                f"DB_BACKEND=postgres requires {', '.join(missing)} to be set "
+                "(in the environment or .env), or use DB_BACKEND=sqlite"
+            )
+        self.pool = BlockingConnectionPool(
+            POOL_MIN_CONN,
+            POOL_MAX_CONN,
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT
+        )
+
+    def getconn(self):
+        return self.pool.getconn()
+
+    def putconn(self, conn, close=False):
+        self.pool.putconn(conn, close=close)
+
+    def closeall(self):
+        self.pool.closeall()
+
+    def is_closed(self, conn):
+        return bool(conn.closed)
+
+    def cursor(self, conn, dict_rows=False):
+        return conn.cursor(cursor_factory=MeteredDictCursor if dict_rows else MeteredCursor)
+
+    def streaming_cursor(self, conn, chunk_size):
+        # Named cursor: rows stay on the server and arrive chunk_size at a time
+        cur = conn.cursor(name=f"stream_{next(_stream_ids)}", cursor_factory=MeteredCursor)
+        cur.itersize = chunk_size
+        return cur
+
+    def ilike(self, expression):
+        return f"{expression} ILIKE %s"
+
+    def copy_rows(self, cur, table, columns, rows):
+        """One COPY FROM STDIN from an in-memory buffer; the server parses the text values"""
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+            count += 1
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        return count
+
+    def estimate_row_count(self, cur, query, params):
+        """Planner estimate of the number of rows (no table scan)"""
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        plan = cur.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+# --- SQLite -----------------------------------------------------------------
+
+# Timestamps are stored as ISO text; read TIMESTAMP/DATE columns back as
+# datetime/date like psycopg2 does
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+_PARAM_PATTERN = re.compile(r"%\((\w+)\)s|%s|%%")
+_MINUTE_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$")
+
+def _to_qmark(query):
+    """Rewrite psycopg2 placeholders (%s, %(name)s) for sqlite3"""
+    def replace(match):
+        if match.group(1):
+            return f":{match.group(1)}"
+        return '?' if match.group(0) == '%s' else '%'
+    return _PARAM_PATTERN.sub(replace, query)
+
+def _canonical_value(value):
+    # 'YYYY-MM-DD HH:MM' text must compare equal to adapted datetimes
+    if isinstance(value, str) and _MINUTE_TIMESTAMP.match(value):
+        return value + ':00'
+    return value
+
+class SQLiteCursor:
+    """sqlite3 cursor accepting psycopg2-style queries, optionally returning dicts"""
+
+    def __init__(self, conn, dict_rows=False):
+        self._cursor = conn.cursor()
+        self._dict_rows = dict_rows
+
+    def _timed(self, method, query, params):
+        start = time.perf_counter()
+        try:
+            return method(_to_qmark(query), params)
+        finally:
+            metrics.record_query(time.perf_counter() - start)
+
+    def execute(self, query, params=None):
+        self._timed(self._cursor.execute, query, params if params is not None else ())
+        return self
+
+    def executemany(self, query, params_list):
+        self._timed(self._cursor.executemany, query, params_list)
+        return self
+
+    def _row(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [self._row(row) for row in rows]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteBackend:
+    """Embedded database file in WAL mode, same schema as Postgres"""
+    name = 'sqlite'
+
+    def __init__(self, path, maxconn=POOL_MAX_CONN):
+        self.path = path
+        self.lock = threading.Lock()
+        self.idle = []
+        self.maxconn = maxconn
+        self.slots = threading.BoundedSemaphore(maxconn)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False  # a connection is only used by the thread that checked it out
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        metrics.record_connect()
+        return conn
+
+    def getconn(self):
+        start = time.perf_counter()
+        _acquire_slot(self.slots, self.maxconn)
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            self.slots.release()
+            raise
+        metrics.record_checkout(time.perf_counter() - start)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            if close:
+                conn.close()
+            else:
+                with self.lock:
+                    self.idle.append(conn)
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+
+    def is_closed(self, conn):
+        return False
+
+    def cursor(self, conn, dict_rows=False):
+        return SQLiteCursor(conn, dict_rows)
+
+    def streaming_cursor(self, conn, chunk_size):
+        # sqlite3 already steps through the result lazily
+        return SQLiteCursor(conn)
+
+    def ilike(self, expression):
+        # LIKE is case-insensitive for ASCII in SQLite
+        return f"{expression} LIKE %s ESCAPE '\\'"
+
+    def copy_rows(self, cur, table, columns, rows):
+        """Bulk insert with executemany (no network round-trips to save)"""
+        rows = [tuple(_canonical_value(value) for value in row) for row in rows]
+        placeholders = ', '.join(['%s'] * len(columns))
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def estimate_row_count(self, cur, query, params):
+        # Counting a local file is cheap enough to be exact
+        cur.execute(f"SELECT COUNT(*) FROM ({query}) AS counted", params)
+        return cur.fetchone()[0]
+
+
+# --- Shared access layer ----------------------------------------------------
+
+_backend = None
+_backend_lock = threading.Lock()
+_local = threading.local()
+
+def get_backend():
+    """Create the configured storage backend (and its pool) on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if DB_BACKEND == 'sqlite':
+                    _backend = SQLiteBackend(SQLITE_PATH)
+                elif DB_BACKEND == 'postgres':
+                    _backend = PostgresBackend()
+                else:
+                    raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}' (expected 'postgres' or 'sqlite')")
+    return _backend
+
+def backend_name():
+    return get_backend().name
+
+def close_pool():
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.closeall()
+            _backend = None
+
+def _checkout():
+    try:
+        return get_backend().getconn()
+    except Exception as e:
+        logger.error(f"Database connection error: {str(e)}")
+        raise
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for one unit of work.
+
+    Commits when the block succeeds and rolls back on error. Inside
+    rerun_scope() the same connection is reused by every block of the rerun.
+    """
+    backend = get_backend()
+    in_rerun = getattr(_local, 'rerun_depth', 0) > 0
+    conn = getattr(_local, 'conn', None) if in_rerun else None
+    owned = conn is None
+    if owned:
+        conn = _checkout()
+        if in_rerun:
+            _local.conn = conn
+
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not backend.is_closed(conn):
+            conn.rollback()
+        raise
+    finally:
+        if backend.is_closed(conn):
+            # Broken connection: drop it so the next block gets a fresh one
+            if in_rerun:
+                _local.conn = None
+            backend.putconn(conn, close=True)
+        elif owned and not in_rerun:
+            backend.putconn(conn)
+
+@contextmanager
+def get_cursor(dict_rows=False):
+    """Context-managed cursor on a pooled connection (dict rows optional)"""
+    with get_connection() as conn:
+        cur = get_backend().cursor(conn, dict_rows)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+@contextmanager
+def rerun_scope():
+    """Share one pooled connection across a whole Streamlit rerun"""
+    _local.rerun_depth = getattr(_local, 'rerun_depth', 0) + 1
+    before = metrics.snapshot()
+    try:
+        yield
+    finally:
+        _local.rerun_depth -= 1
+        if _local.rerun_depth == 0:
+            conn = getattr(_local, 'conn', None)
+            _local.conn = None
+            if conn is not None:
+                get_backend().putconn(conn)
+            after = metrics.snapshot()
+            logger.debug(
+                f"Rerun used {after['query_count'] - before['query_count']} queries, "
+                f"waited {(after['pool_wait_total'] - before['pool_wait_total']) * 1000:.1f} ms for the pool"
+            )
+
+def copy_rows(cur, table, columns, rows):
+    """Bulk load rows: COPY FROM STDIN on Postgres, executemany on SQLite.
+
+    Values may be text the database parses itself, so dates can stay in
+    their 'YYYY-MM-DD HH:MM' string form. Returns the number of rows.
+    """
+    return get_backend().copy_rows(cur, table, columns, rows)
+
+def in_clause(column, values):
+    """Portable `column IN (...)` fragment and its parameters"""
+    values = list(values)
+    return f"{column} IN ({', '.join(['%s'] * len(values))})", values
+
+def _search_clause(search, search_columns):
+    """Case-insensitive substring filter over several columns; returns (sql, params)"""
+    if not search or not search_columns:
+        return None, []
+    pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    backend = get_backend()
+    clause = '(' + ' OR '.join(backend.ilike(f"CAST({column} AS TEXT)") for column in search_columns) + ')'
+    return clause, [pattern] * len(search_columns)
+
+def fetch_keyset_page(table, columns, order_by, key_column='id', descending=False,
+                      after=None, search=None, search_columns=(), page_size=50):
+    """Fetch one page of rows with keyset (seek) pagination.
+
+    Rows are ordered by (order_by, key_column); `after` is the (sort value, key)
+    pair of the last row of the previous page, or None for the first page.
+    Table and column names are interpolated and must come from code, never
+    from user input. Returns (rows as tuples in `columns` order, next `after`
+    or None when this is the last page).
+    """
+    direction = 'DESC' if descending else 'ASC'
+    where, params = [], []
+
+    clause, search_params = _search_clause(search, search_columns)
+    if clause:
+        where.append(clause)
+        params.extend(search_params)
+    if after is not None:
+        where.append(f"({order_by}, {key_column}) {'<' if descending else '>'} (%s, %s)")
+        params.extend(after)
+
+    query = (
+        f"SELECT {', '.join(columns)}, {order_by} AS page_sort_value, {key_column} AS page_key "
+        f"FROM {table} "
+        + (f"WHERE {' AND '.join(where)} " if where else "")
+        + f"ORDER BY {order_by} {direction}, {key_column} {direction} LIMIT %s"
+    )
+    params.append(page_size + 1)
+
+    with get_cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+
+    next_after = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_after = (rows[-1][-2], rows[-1][-1])
+    width = len(columns)
+    return [row[:width] for row in rows], next_after
+
+def estimate_row_count(table, search=None, search_columns=()):
+    """Approximate number of matching rows (planner estimate on Postgres)"""
+    clause, params = _search_clause(search, search_columns)
+    query = f"SELECT 1 FROM {table}" + (f" WHERE {clause}" if clause else "")
+    with get_cursor() as cur:
+        return get_backend().estimate_row_count(cur, query, params)
+
+def iter_row_chunks(query, params=None, chunk_size=FETCH_CHUNK_SIZE):
+    """Stream a large result as (column names, list of tuples) chunks.
+
+    Postgres uses a named server-side cursor, so at most chunk_size rows are
+    held in memory at a time. Consume the generator fully (or close it)
+    before opening another connection block in the same thread.
+    """
+    with get_connection() as conn:
+        cur = get_backend().streaming_cursor(conn, chunk_size)
+        try:
+            cur.execute(query, params)
+            columns = None
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if columns is None:
+                    columns = [column[0] for column in cur.description]
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cur.close()
+
+def read_frame(query, params=None, chunk_size=FETCH_CHUNK_SIZE):
+    """Run a query and build a DataFrame column-wise from tuple chunks"""
+    columns, data = None, None
+    for chunk_columns, rows in iter_row_chunks(query, params, chunk_size):
+        if data is None:
+            columns = chunk_columns
+            data = [[] for _ in columns]
+        for values, column_values in zip(data, zip(*rows)):
+            values.extend(column_values)
+    if data is None:
+        return pd.DataFrame()
+    return pd.DataFrame(dict(zip(columns, data)), columns=columns)
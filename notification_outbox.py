@@ -0,0 +1,223 @@
+import os
+import smtplib
+import threading
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from db import get_cursor, copy_rows, backend_name
+from notification_system import build_message, dispatcher, schedule_notice
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Rows claimed per round (sent in parallel over the dispatcher's sessions)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+
+# Attempts before a message is dead-lettered, and the first retry delay
+# (doubled after every failed attempt)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+
+# Idle worker poll interval, and when a 'sending' row of a crashed worker
+# becomes claimable again
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_CLAIM_TIMEOUT = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "600"))
+
+OUTBOX_STATUSES = ('pending', 'sending', 'sent', 'dead')
+
+def enqueue_notifications(messages, batch=None):
+    """Queue (recipient, subject, body) messages; returns how many were queued.
+
+    The caller returns immediately; the background worker sends them.
+    """
+    now = datetime.now()
+    rows = [(batch, recipient, subject, body, now) for recipient, subject, body in messages if recipient]
+    with get_cursor() as cur:
+        copy_rows(cur, 'notification_outbox', ('batch', 'recipient', 'subject', 'body', 'next_attempt_at'), rows)
+    worker.notify()
+    logger.info(f"Queued {len(rows)} notifications (batch {batch})")
+    return len(rows)
+
+def enqueue_schedule_notifications(schedule_data, batch=None):
+    """Queue the scheduled-presentation notice of every formatted schedule row"""
+    messages = []
+    for item in schedule_data:
+        presentation = {
+            'student': item['Student'],
+            'topic': item['Topic'],
+            'date_time': datetime.strptime(item['Date & Time'], '%Y-%m-%d %H:%M'),
+            'room': item['Room'],
+            'president': item['President'],
+            'rapporteur': item['Rapporteur'],
+            'supervisor': item['Supervisor']
+        }
+        subject, body = schedule_notice(presentation)
+        recipients = [
+            item['Student'],  # Add proper email addresses
+            item['President'],
+            item['Rapporteur'],
+            item['Supervisor']
+        ]
+        messages.extend((recipient, subject, body) for recipient in recipients)
+    return enqueue_notifications(messages, batch)
+
+def _claim(batch_size):
+    """Mark up to batch_size due messages as sending and return them"""
+    now = datetime.now()
+    # Concurrent workers on Postgres skip each other's rows; SQLite
+    # serializes the UPDATE on its write lock
+    skip_locked = "FOR UPDATE SKIP LOCKED" if backend_name() == 'postgres' else ""
+    with get_cursor() as cur:
+        cur.execute(f"""
+            UPDATE notification_outbox
+            SET status = 'sending', attempts = attempts + 1, claimed_at = %s
+            WHERE id IN (
+                SELECT id FROM notification_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= %s)
+                   OR (status = 'sending' AND claimed_at < %s)
+                ORDER BY id
+                LIMIT %s
+                {skip_locked}
+            )
+            RETURNING id, recipient, subject, body, attempts
+        """, (now, now, now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT), batch_size))
+        return cur.fetchall()
+
+def _permanent(error):
+    # 5xx replies will fail again; 4xx ones (greylisting, full mailbox) may not
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+def drain_outbox(smtp_dispatcher=dispatcher, batch_size=OUTBOX_BATCH_SIZE):
+    """Send one round of due messages; returns the number processed.
+
+    Failed messages are rescheduled with exponential backoff, or marked
+    dead once OUTBOX_MAX_ATTEMPTS is reached or the server refused them.
+    """
+    claimed = _claim(batch_size)
+    if not claimed:
+        return 0
+
+    results = smtp_dispatcher.send_many(
+        build_message(recipient, subject, body) for _, recipient, subject, body, _ in claimed
+    )
+
+    now = datetime.now()
+    updates = []
+    for (row_id, recipient, _, _, attempts), error in zip(claimed, results):
+        if error is None:
+            updates.append(('sent', now, now, None, row_id))
+        elif attempts >= OUTBOX_MAX_ATTEMPTS or _permanent(error):
+            logger.error(f"Notification {row_id} to {recipient} dead-lettered: {str(error)}")
+            updates.append(('dead', now, None, str(error), row_id))
+        else:
+            retry_at = now + timedelta(seconds=OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+            updates.append(('pending', retry_at, None, str(error), row_id))
+    with get_cursor() as cur:
+        cur.executemany("""
+            UPDATE notification_outbox
+            SET status = %s, next_attempt_at = %s, sent_at = %s, last_error = %s
+            WHERE id = %s
+        """, updates)
+
+    sent = sum(1 for update in updates if update[0] == 'sent')
+    logger.info(f"Outbox round: {sent}/{len(claimed)} sent")
+    return len(claimed)
+
+def outbox_progress(batch):
+    """Message counts of a batch by status (every status present)"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT status, COUNT(*) FROM notification_outbox
+            WHERE batch = %s
+            GROUP BY status
+        """, (batch,))
+        counts = dict(cur.fetchall())
+    return {status: counts.get(status, 0) for status in OUTBOX_STATUSES}
+
+def list_dead_letters(batch, limit=50):
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT id, recipient, subject, attempts, last_error
+            FROM notification_outbox
+            WHERE batch = %s AND status = 'dead'
+            ORDER BY id
+            LIMIT %s
+        """, (batch, limit))
+        return cur.fetchall()
+
+def retry_dead_letters(batch):
+    """Requeue the dead messages of a batch with fresh attempts"""
+    with get_cursor() as cur:
+        cur.execute("""
+            UPDATE notification_outbox
+            SET status = 'pending', attempts = 0, next_attempt_at = %s
+            WHERE batch = %s AND status = 'dead'
+        """, (datetime.now(), batch))
+        count = cur.rowcount
+    worker.notify()
+    return count
+
+class OutboxWorker:
+    """Daemon thread draining the outbox until it is empty, then polling.
+
+    Parallelism is bounded by the dispatcher's SMTP session pool. Any
+    number of workers (threads or processes) can share one outbox.
+    """
+
+    def __init__(self, smtp_dispatcher, poll_interval=OUTBOX_POLL_SECONDS, batch_size=OUTBOX_BATCH_SIZE):
+        self.dispatcher = smtp_dispatcher
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+            self.thread.start()
+
+    def notify(self):
+        """Wake the worker now instead of at the next poll"""
+        self.wakeup.set()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                busy = drain_outbox(self.dispatcher, self.batch_size) > 0
+            except Exception as e:
+                logger.error(f"Outbox worker error: {str(e)}")
+                busy = False
+            if not busy:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+worker = OutboxWorker(dispatcher)
+
+def start_outbox_worker():
+    """Start this process's outbox worker (no-op when already running)"""
+    worker.start()
+
+if __name__ == "__main__":
+    # Standalone worker, e.g. when the app itself should not send email
+    from schema import init_schema
+    with get_cursor() as cur:
+        init_schema(cur)
+    worker.start()
+    worker.thread.join()
@@ -1,12 +1,14 @@
+import queue
 import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 import logging
+from db import get_cursor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,47 +22,198 @@ SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_SENDER = os.getenv("SMTP_SENDER", SMTP_USERNAME)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
 
-# Database configuration
-DB_HOST = os.getenv("PGHOST", "aws-0-eu-central-1.pooler.supabase.com")
-DB_NAME = os.getenv("PGDATABASE", "postgres")
-DB_USER = os.getenv("PGUSER", "postgres.lvonpafzqjfxqenzvjth")
-DB_PASSWORD = os.getenv("PGPASSWORD", "trtrtr123")
-DB_PORT = os.getenv("PGPORT", "5432")
-
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=DB_PORT
-    )
+# Concurrent sessions kept open by the dispatcher, and reconnects per message
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_SEND_RETRIES = int(os.getenv("SMTP_SEND_RETRIES", "2"))
+
+def _session_closed(error):
+    """True for 421 replies: the server is closing the session, and smtplib
+    has already closed the socket"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code == 421 for code, _ in error.recipients.values())
+    return error.smtp_code == 421
+
+class SMTPUnavailable(OSError):
+    """Connecting to the SMTP server failed; the rest of a batch is failed
+    without trying, and left to the caller's retry schedule"""
+
+class SMTPDispatcher:
+    """Sends mail over a small pool of long-lived, authenticated SMTP sessions.
+
+    A session is opened (connect, STARTTLS, login) the first time it is
+    needed and reused for every later message. A session the server dropped
+    is reopened and the message resent, so callers never see idle timeouts.
+    """
+
+    def __init__(self, server=SMTP_SERVER, port=SMTP_PORT, username=SMTP_USERNAME,
+                 password=SMTP_PASSWORD, pool_size=SMTP_POOL_SIZE, use_tls=SMTP_STARTTLS):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        self.use_tls = use_tls
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            self._close(smtp)
+            raise
+        return smtp
+
+    def _close(self, smtp):
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except (OSError, smtplib.SMTPException):
+            smtp.close()
+
+    def _checkout(self):
+        """Take a pool slot and an idle session (None: connect on first send)"""
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _checkin(self, smtp):
+        if smtp is not None:
+            self.idle.put(smtp)
+        self.slots.release()
+
+    def _deliver(self, smtp, msg):
+        """Send one message, reconnecting when the session was lost.
+
+        Returns (session to keep using or None, exception or None).
+        """
+        error = None
+        for attempt in range(SMTP_SEND_RETRIES + 1):
+            if smtp is None:
+                try:
+                    smtp = self._connect()
+                except OSError as e:
+                    # Unreachable server: every retry would wait SMTP_TIMEOUT again
+                    return None, SMTPUnavailable(f"Cannot connect to {self.server}:{self.port}: {str(e)}")
+            try:
+                smtp.send_message(msg)
+                return smtp, None
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                if not _session_closed(e):
+                    # The server answered; resending the same message won't help
+                    return smtp, e
+                error = e
+            except OSError as e:
+                # SMTPServerDisconnected, resets and timeouts
+                error = e
+            except Exception as e:
+                # Malformed message: fail it alone, on a fresh session next time
+                self._close(smtp)
+                return None, e
+            logger.warning(f"SMTP session lost ({str(error)}), reconnecting")
+            self._close(smtp)
+            smtp = None
+        return None, error
+
+    def send(self, msg):
+        """Send one message; returns None on success, else the exception"""
+        smtp = self._checkout()
+        try:
+            smtp, error = self._deliver(smtp, msg)
+        finally:
+            self._checkin(smtp)
+        return error
+
+    def send_many(self, messages):
+        """Send a batch over up to pool_size sessions in parallel.
+
+        Messages are spread over the sessions and sent back to back on
+        each. Once the server can't be reached, the remaining messages fail
+        with the same SMTPUnavailable error without being tried. Returns one
+        entry per message, in order: None when sent, else the exception.
+        """
+        messages = list(messages)
+        results = [None] * len(messages)
+        workers = min(self.pool_size, len(messages))
+        unavailable = []
+
+        def send_share(indexes):
+            smtp = self._checkout()
+            try:
+                for i in indexes:
+                    if unavailable:
+                        results[i] = unavailable[0]
+                        continue
+                    smtp, results[i] = self._deliver(smtp, messages[i])
+                    if isinstance(results[i], SMTPUnavailable):
+                        unavailable.append(results[i])
+            finally:
+                self._checkin(smtp)
+
+        if workers == 1:
+            send_share(range(len(messages)))
+        elif workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(send_share, [range(i, len(messages), workers) for i in range(workers)]))
+        if unavailable:
+            logger.error(f"{str(unavailable[0])}; failed the remaining messages of the batch")
+        return results
+
+    def close(self):
+        """Quit every idle session"""
+        while True:
+            try:
+                self._close(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+dispatcher = SMTPDispatcher()
+
+def build_message(recipient_email, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_SENDER
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
 
 def send_email(recipient_email, subject, body):
-    """Send an email using SMTP"""
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
-            
-        logger.info(f"Email sent successfully to {recipient_email}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
+    """Send an email over a pooled SMTP session"""
+    error = dispatcher.send(build_message(recipient_email, subject, body))
+    if error is not None:
+        logger.error(f"Failed to send email: {str(error)}")
         return False
+    logger.info(f"Email sent successfully to {recipient_email}")
+    return True
 
-def send_schedule_notification(presentation, recipients):
-    """Send a notification about a scheduled presentation"""
+def send_bulk_email(recipients, subject, body):
+    """Send the same notice to every recipient in one dispatcher batch.
+
+    Returns the number of messages sent.
+    """
+    recipients = [recipient for recipient in recipients if recipient]
+    results = dispatcher.send_many(build_message(recipient, subject, body) for recipient in recipients)
+    for recipient, error in zip(recipients, results):
+        if error is not None:
+            logger.error(f"Failed to send email to {recipient}: {str(error)}")
+    sent = results.count(None)
+    logger.info(f"Sent {sent}/{len(recipients)} emails: {subject}")
+    return sent
+
+def schedule_notice(presentation):
+    """(subject, body) announcing a scheduled presentation"""
     subject = f"PFE Presentation Scheduled: {presentation['student']}"
     
     body = f"""
@@ -83,12 +236,10 @@ def send_schedule_notification(presentation, recipients):
     Best regards,
     PFE Schedule Manager
     """
-    
-    for recipient in recipients:
-        send_email(recipient, subject, body)
+    return subject, body
 
-def send_reminder(presentation, recipients, hours_before):
-    """Send a reminder before the presentation"""
+def reminder_notice(presentation, hours_before):
+    """(subject, body) reminding of an upcoming presentation"""
     subject = f"Reminder: PFE Presentation - {presentation['student']}"
     
     body = f"""
@@ -106,23 +257,30 @@ def send_reminder(presentation, recipients, hours_before):
     Best regards,
     PFE Schedule Manager
     """
-    
-    for recipient in recipients:
-        send_email(recipient, subject, body)
+    return subject, body
+
+def send_schedule_notification(presentation, recipients):
+    """Send a notification about a scheduled presentation"""
+    subject, body = schedule_notice(presentation)
+    return send_bulk_email(recipients, subject, body)
+
+def send_reminder(presentation, recipients, hours_before):
+    """Send a reminder before the presentation"""
+    subject, body = reminder_notice(presentation, hours_before)
+    return send_bulk_email(recipients, subject, body)
 
 def check_upcoming_presentations():
     """Check for upcoming presentations and send reminders"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     # Get presentations in the next 24 hours
-    cur.execute("""
-        SELECT * FROM schedules 
-        WHERE date_time BETWEEN NOW() AND NOW() + INTERVAL '24 hours'
-        ORDER BY date_time
-    """)
-    
-    upcoming = cur.fetchall()
+    now = datetime.now()
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT * FROM active_schedules 
+            WHERE date_time BETWEEN %s AND %s
+            ORDER BY date_time
+        """, (now, now + timedelta(hours=24)))
+        
+        upcoming = cur.fetchall()
     
     for presentation in upcoming:
         time_until = presentation['date_time'] - datetime.now()
@@ -142,6 +300,3 @@ def check_upcoming_presentations():
             send_reminder(presentation, recipients, 4)
         elif 0.75 <= hours_until <= 1:  # 1-hour reminder
             send_reminder(presentation, recipients, 1)
-    
-    cur.close()
-    conn.close()
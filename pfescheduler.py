@@ -1,16 +1,16 @@
 from datetime import datetime, timedelta
 import random
 from collections import defaultdict
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm, mm
-from reportlab.platypus import KeepTogether, Image
-import qrcode
 import io
+from schedule_export import write_schedule_csv, write_schedule_html
+from room_occupancy import build_occupancy_matrix
+# Topic-text classifier (hashing features, trained incrementally); both
+# classifiers output the project_classifier.DEPARTMENTS names
+from project_classifier import canonical_department, topic_classifier as classifier
 
 def generate_qr_code(data):
+    import qrcode
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(data)
     qr.make(fit=True)
@@ -20,14 +20,6 @@ def generate_qr_code(data):
     img_byte_arr.seek(0)
     return img_byte_arr
 
-# Placeholder classifier - Needs to be replaced with actual classifier
-class Classifier:
-    def classify_project(self, topic):
-        # Replace this with actual classification logic
-        departments = ["Informatique", "Electrique", "Mecanique", "Civil", "Industriel"]
-        return random.choice(departments)
-
-classifier = Classifier()
 
 class PFEScheduler:
     def __init__(self):
@@ -37,12 +29,15 @@ class PFEScheduler:
         self.unavailable_slots = {}
         self.rooms = self._initialize_rooms()
         self.room_schedule = {}  # Track room usage
+        # Keyed by project_classifier.DEPARTMENTS
         self.department_blocks = {
             "Informatique": "K",
-            "Electrique": "I",
-            "Mecanique": "M",
-            "Civil": "G",
-            "Industriel": "G"
+            "Electronique": "I",
+            "Mechanique": "M",
+            "Genie Civil": "G",
+            "Mathematiques": "K",
+            "Process Control": "G",
+            "Industrial Design": "G"
         }
         # Track which professors are scheduled at which time slots
         self.professor_time_schedule = defaultdict(set)
@@ -56,9 +51,13 @@ class PFEScheduler:
                 rooms.append(room_id)
         return rooms
 
-    def add_presentation(self, topic, student, supervisor):
-        # Classify the project
-        department = classifier.classify_project(topic)
+    def add_presentation(self, topic, student, supervisor, department=None,
+                         classifier_version=None, confidence=None, subject_code=None):
+        # Classify the project unless the caller already did
+        if department is None:
+            department, confidence = classifier.classify_with_confidence(topic)
+            classifier_version = classifier.version
+        department = canonical_department(department)
 
         self.presentations.append({
             'topic': topic,
@@ -67,7 +66,10 @@ class PFEScheduler:
             'scheduled_time': None,
             'room': None,
             'jury': [],
-            'department': department
+            'department': department,
+            'classifier_version': classifier_version,
+            'confidence': confidence,
+            'subject_code': subject_code
         })
 
         if supervisor not in self.professors:
@@ -80,6 +82,21 @@ class PFEScheduler:
             }
         self.professors[supervisor]['supervised_count'] += 1
 
+    def add_presentations(self, presentations):
+        """Add many presentations (dicts with add_presentation's arguments).
+
+        Topics without a department are classified together in one
+        vectorized call.
+        """
+        presentations = [dict(p) for p in presentations]
+        missing = [p for p in presentations if p.get('department') is None]
+        if missing:
+            results = classifier.classify_many_with_confidence([p['topic'] for p in missing])
+            for p, (department, confidence) in zip(missing, results):
+                p.update(department=department, classifier_version=classifier.version, confidence=confidence)
+        for p in presentations:
+            self.add_presentation(**p)
+
     def set_professor_unavailability(self, professor, unavailable_slots):
         if professor not in self.unavailable_slots:
             self.unavailable_slots[professor] = []
@@ -621,6 +638,10 @@ class PFEScheduler:
                 })
         return room_usage
 
+    def get_occupancy_matrix(self):
+        """Room x slot occupancy of the scheduled presentations (see room_occupancy)"""
+        return build_occupancy_matrix(self.export_schedule(), rooms=self.rooms)
+
     def get_professor_schedule(self):
         """Get a summary of each professor's schedule"""
         professor_schedule = {}
@@ -680,11 +701,27 @@ class PFEScheduler:
                     'student': p['student'],
                     'room': p['room'],
                     'jury': p['jury'],
-                    'department': p['department']
+                    'department': p['department'],
+                    'classifier_version': p['classifier_version'],
+                    'confidence': p['confidence'],
+                    'subject_code': p['subject_code']
                 })
         return schedule
 
+    def generate_html(self, buffer):
+        """Write a static HTML schedule (quick preview, no ReportLab)"""
+        return write_schedule_html(self.export_schedule(), buffer)
+
+    def generate_csv(self, buffer, delimiter=','):
+        """Write the schedule as CSV, or TSV with delimiter='\\t'"""
+        return write_schedule_csv(self.export_schedule(), buffer, delimiter=delimiter)
+
     def generate_pdf(self, filename="schedule.pdf"):
+        # ReportLab is only imported for print jobs
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import landscape
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
         from reportlab.lib.units import cm, mm
 
         # Custom large page size (A2 landscape)
@@ -849,6 +886,10 @@ class PFEScheduler:
 
     def generate_professor_schedules_pdf(self, filename="professor_schedules.pdf"):
         """Generate individual schedules for each professor"""
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import landscape
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
         from reportlab.lib.units import cm, mm
 
         # Use A4 landscape for individual schedules
@@ -1,66 +1,192 @@
 
+import hashlib
+import json
 import logging
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-import numpy as np
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fitted models are saved here, one file per training data version
+ARTIFACT_DIR = os.getenv("CLASSIFIER_ARTIFACT_DIR", "artifacts")
+
+# Most recent ML fallback results kept in memory
+CLASSIFICATION_CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "4096"))
+
+# codeSujet patterns of each department. Its keys are the department names
+# both classifiers output and PFEScheduler.department_blocks maps to blocks
+DEPARTMENT_CODES = {
+    'Informatique': ['MI', 'ISI', 'SI2', 'INFO'],
+    'Electronique': ['ENG', 'ELEC'],
+    'Mechanique': ['PROD', 'MEC'],
+    'Genie Civil': ['BAT', 'GC'],
+    'Mathematiques': ['MA'],
+    'Process Control': ['P&C', 'CPI'],
+    'Industrial Design': ['DI']
+}
+DEPARTMENTS = tuple(DEPARTMENT_CODES)
+
+# Other spellings found in labelled spreadsheets
+DEPARTMENT_ALIASES = {
+    'Electrique': 'Electronique',
+    'Mecanique': 'Mechanique',
+    'Civil': 'Genie Civil',
+    'Industriel': 'Process Control'
+}
+
+def canonical_department(name):
+    """Shared department name of a label, or the label unchanged"""
+    if not isinstance(name, str):
+        return name
+    name = name.strip()
+    return DEPARTMENT_ALIASES.get(name, name)
+
+
+class ClassificationCache:
+    """Bounded, thread-safe LRU of (model version, subject) -> (department, confidence)"""
+
+    def __init__(self, maxsize):
+        self.lock = threading.Lock()
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def get_many(self, keys):
+        """Cached values of the given keys (one lock round for the batch)"""
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        self.put_many({key: value})
+
+    def put_many(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'maxsize': self.maxsize
+            }
+
 class ProjectClassifier:
-    def __init__(self):
+    def __init__(self, artifact_dir=ARTIFACT_DIR):
+        # Extended training data for departments based on codeSujet patterns
+        self.train_data = {dept: list(codes) for dept, codes in DEPARTMENT_CODES.items()}
+        self.artifact_dir = artifact_dir
+        self._lock = threading.Lock()
+        self.cache = ClassificationCache(CLASSIFICATION_CACHE_SIZE)
+
+        # The ML fallback is loaded (or trained) on first use, see _get_model
+        self._model = None
+        self._compile_matcher()
+
+        # Stored with every persisted classification; rows with another
+        # version are reclassified by the backfill
+        self.version = self.compute_version()
+
+    def set_training_data(self, train_data):
+        """Replace the training data; the model is retrained on next use"""
+        with self._lock:
+            self.train_data = train_data
+            self._compile_matcher()
+            self.version = self.compute_version()
+            self._model = None
+        # Results of the previous model are never looked up again
+        self.cache.clear()
+
+    def _get_model(self):
+        """(vectorizer, classifier) pair, loaded once per process"""
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load_or_train()
+                model = self._model
+        return model
+
+    def artifact_path(self):
+        return os.path.join(self.artifact_dir, f"project_classifier-{self.version}.pkl")
+
+    def _load_or_train(self):
+        """Load the artifact of the current training data, or train and save it"""
+        import sklearn
+
+        path = self.artifact_path()
+        try:
+            with open(path, 'rb') as f:
+                artifact = pickle.load(f)
+            if artifact['version'] == self.version and artifact['sklearn'] == sklearn.__version__:
+                logger.info(f"Loaded classifier {self.version} from {path}")
+                return artifact['vectorizer'], artifact['classifier']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable classifier artifact {path}: {str(e)}")
+
+        vectorizer, classifier = self.fit()
+        try:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({
+                    'version': self.version,
+                    'sklearn': sklearn.__version__,
+                    'vectorizer': vectorizer,
+                    'classifier': classifier
+                }, f)
+            os.replace(tmp_path, path)
+            logger.info(f"Trained classifier {self.version} and saved it to {path}")
+        except OSError as e:
+            logger.warning(f"Could not save classifier artifact: {str(e)}")
+        return vectorizer, classifier
+
+    def fit(self):
+        """Train the ML fallback on train_data; returns (vectorizer, classifier)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
         # Initialize the vectorizer with specific settings for code patterns
-        self.vectorizer = TfidfVectorizer(
+        vectorizer = TfidfVectorizer(
             max_features=100,
             token_pattern=r'[A-Za-z0-9\-]+',  # Pattern to match code subject format
             lowercase=True
         )
 
-        # Extended training data for departments based on codeSujet patterns
-        self.train_data = {
-            'Informatique': ['MI', 'ISI', 'SI2', 'INFO'],
-            'Electronique': ['ENG', 'ELEC'],
-            'Mechanique': ['PROD', 'MEC'],
-            'Genie Civil': ['BAT', 'GC'],
-            'Mathematiques': ['MA'],
-            'Process Control': ['P&C', 'CPI'],
-            'Industrial Design': ['DI']
-        }
-
-        # Extract department code from codeSujet
-        def extract_dept_code(code):
-            if not isinstance(code, str):
-                return str(code)
-            # Remove any whitespace and convert to uppercase
-            code = code.strip().upper()
-            
-            # Try to find matching department code
-            for dept, patterns in self.train_data.items():
-                if any(pattern.upper() in code for pattern in patterns):
-                    return dept
-            
-            # Handle different code formats
-            parts = code.split('-')
-            if len(parts) >= 2:
-                # Extract department code from format L-DEPTXX-XXX
-                dept_code = parts[1][:2] if parts[1].startswith('MA') else parts[1][:3]
-                dept_code = ''.join(filter(str.isalpha, dept_code))  # Remove numbers
-                
-                for dept, patterns in self.train_data.items():
-                    if any(pattern.upper() == dept_code.upper() for pattern in patterns):
-                        return dept
-            
-            # Try finding any pattern in the full code
-            for dept, patterns in self.train_data.items():
-                if any(pattern.upper() in code.upper() for pattern in patterns):
-                    return dept
-            
-            return "Other"  # Default category if no match found
-
-        self.extract_dept_code = extract_dept_code
-
         # Prepare training data
         X_train = []
         y_train = []
@@ -70,39 +196,394 @@ class ProjectClassifier:
                 y_train.append(dept)
 
         # Fit vectorizer and train classifier
-        X_train_vec = self.vectorizer.fit_transform(X_train)
-        self.classifier = MultinomialNB()
-        self.classifier.fit(X_train_vec, y_train)
+        X_train_vec = vectorizer.fit_transform(X_train)
+        classifier = MultinomialNB()
+        classifier.fit(X_train_vec, y_train)
+        return vectorizer, classifier
 
-    def classify_project(self, subject):
+    def _compile_matcher(self):
+        """Precompute one regex over every pattern of train_data.
+
+        Departments keep their train_data order as priority: when several
+        patterns occur in a code, the department listed first wins, as it
+        did with the nested loops.
+        """
+        pattern_priority = {}
+        exact_codes = {}
+        for priority, (dept, patterns) in enumerate(self.train_data.items()):
+            for pattern in patterns:
+                pattern = pattern.upper()
+                pattern_priority.setdefault(pattern, (priority, dept))
+                exact_codes.setdefault(pattern, dept)
+
+        # A lookahead reports a match at every position (overlaps included);
+        # at one position the higher-priority (then longer) pattern is tried first
+        ordered = sorted(pattern_priority, key=lambda p: (pattern_priority[p][0], -len(p)))
+        matcher = re.compile('(?=(' + '|'.join(re.escape(p) for p in ordered) + '))') if ordered else None
+
+        # Swapped in one assignment so concurrent readers see a consistent set
+        self._patterns = (matcher, pattern_priority, exact_codes)
+
+    def extract_dept_code(self, code):
+        """Department of a codeSujet by pattern matching, or 'Other'"""
+        if not isinstance(code, str):
+            return str(code)
+        # Remove any whitespace and convert to uppercase
+        code = code.strip().upper()
+
+        matcher, pattern_priority, exact_codes = self._patterns
+
+        # Any pattern anywhere in the code, in a single scan
+        if matcher is not None:
+            best = None
+            for match in matcher.finditer(code):
+                found = pattern_priority[match.group(1)]
+                if best is None or found[0] < best[0]:
+                    best = found
+                    if best[0] == 0:
+                        break
+            if best is not None:
+                return best[1]
+
+        # Handle different code formats
+        parts = code.split('-')
+        if len(parts) >= 2:
+            # Extract department code from format L-DEPTXX-XXX
+            dept_code = parts[1][:2] if parts[1].startswith('MA') else parts[1][:3]
+            dept_code = ''.join(filter(str.isalpha, dept_code))  # Remove numbers
+            if dept_code in exact_codes:
+                return exact_codes[dept_code]
+
+        return "Other"  # Default category if no match found
+
+    def compute_version(self):
+        """Short fingerprint of the model type and its training data"""
+        payload = json.dumps({
+            'model': 'MultinomialNB',
+            'vectorizer': 'TfidfVectorizer',
+            'train_data': self.train_data
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def _cache_key(self, subject):
+        # The vectorizer lowercases, so case and outer whitespace never
+        # change the result
+        return (self.version, subject.strip().upper())
+
+    def classify_with_confidence(self, subject):
         """
         Classify a project subject into a department
-        Returns department name
+        Returns (department name, confidence between 0 and 1)
         """
         try:
             if not isinstance(subject, str):
                 subject = str(subject)
-            
-            # Direct pattern matching first
+
+            # Direct pattern matching first; a single regex scan is cheaper
+            # than a cache round, and codes are mostly unique anyway
             department = self.extract_dept_code(subject)
             if department != "Other":
                 logger.info(f"Classified '{subject}' as '{department}' using pattern matching")
-                return department
-                
+                return department, 1.0
+
+            key = self._cache_key(subject)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
             # Fallback to ML classification
-            subject_vec = self.vectorizer.transform([subject])
-            department = self.classifier.predict(subject_vec)[0]
+            vectorizer, model = self._get_model()
+            subject_vec = vectorizer.transform([subject])
+            probabilities = model.predict_proba(subject_vec)[0]
+            best = probabilities.argmax()
+            department = model.classes_[best]
             
             logger.info(f"Classified '{subject}' as '{department}' using ML")
-            return department
+            self.cache.put(key, (department, float(probabilities[best])))
+            return department, float(probabilities[best])
 
         except Exception as e:
             logger.error(f"Error classifying project: {str(e)}")
-            return "Unclassified"
+            return "Unclassified", 0.0
 
-# Initialize classifier
+    def classify_project(self, subject):
+        """
+        Classify a project subject into a department
+        Returns department name
+        """
+        return self.classify_with_confidence(subject)[0]
+
+    def classify_many_with_confidence(self, subjects):
+        """
+        Classify a batch of project subjects
+        Returns a list of (department name, confidence) in input order
+        """
+        subjects = [subject if isinstance(subject, str) else str(subject) for subject in subjects]
+
+        # Pattern matching once per distinct subject
+        known = {}
+        unmatched = {}
+        for subject in dict.fromkeys(subjects):
+            department = self.extract_dept_code(subject)
+            if department != "Other":
+                known[subject] = (department, 1.0)
+            else:
+                unmatched[subject] = self._cache_key(subject)
+
+        # Cached ML results next, then one sparse transform/predict for the rest
+        distinct = {key: subject for subject, key in unmatched.items()}
+        cached = self.cache.get_many(distinct)
+        pending = [key for key in distinct if key not in cached]
+        if pending:
+            try:
+                vectorizer, model = self._get_model()
+                subject_vec = vectorizer.transform([distinct[key] for key in pending])
+                probabilities = model.predict_proba(subject_vec)
+                best = probabilities.argmax(axis=1)
+                for key, row, column in zip(pending, probabilities, best):
+                    cached[key] = (model.classes_[column], float(row[column]))
+                self.cache.put_many({key: cached[key] for key in pending})
+            except Exception as e:
+                logger.error(f"Error classifying projects: {str(e)}")
+                for key in pending:
+                    cached[key] = ("Unclassified", 0.0)
+        for subject, key in unmatched.items():
+            known[subject] = cached[key]
+
+        stats = self.cache.stats()
+        logger.info(
+            f"Classified {len(subjects)} subjects: {len(known) - len(unmatched)} distinct using pattern "
+            f"matching, {len(distinct) - len(pending)} from the cache, {len(pending)} using ML "
+            f"(cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']}/{stats['maxsize']} entries)"
+        )
+        return [known[subject] for subject in subjects]
+
+    def classify_many(self, subjects):
+        """
+        Classify a batch of project subjects
+        Returns a list of department names in input order
+        """
+        return [department for department, _ in self.classify_many_with_confidence(subjects)]
+
+# Shared instance; cheap to create, the model is loaded on first ML fallback
 classifier = ProjectClassifier()
 
+# Seed examples for the topic-text model, one entry per DEPARTMENTS name;
+# labelled spreadsheets are learned on top
+TOPIC_SEED_DATA = {
+    'Informatique': [
+        'web application development', 'mobile application', 'software platform',
+        'database management system', 'machine learning model', 'artificial intelligence AI',
+        'computer vision recognition', 'data analysis dashboard', 'cloud computing service',
+        'cybersecurity network security', 'chatbot natural language processing',
+        'information system management', 'real-time tracking application', 'deep learning'
+    ],
+    'Electronique': [
+        'electrical power system', 'solar energy photovoltaic', 'smart grid energy management',
+        'electric motor control', 'power electronics converter', 'embedded system microcontroller',
+        'sensor network IoT device', 'battery charging station', 'signal processing circuit',
+        'electrical installation', 'automation PLC control'
+    ],
+    'Mechanique': [
+        'mechanical design', 'thermal analysis heat transfer', 'fluid mechanics flow',
+        'turbine engine performance', 'robotic arm mechanism', 'CAD modelling simulation',
+        'vibration analysis', 'HVAC system', 'finite element analysis', 'mechanical maintenance'
+    ],
+    'Genie Civil': [
+        'civil engineering structure', 'building construction', 'bridge design',
+        'reinforced concrete', 'road pavement', 'geotechnical foundation soil',
+        'hydraulic water network', 'urban planning infrastructure', 'structural analysis'
+    ],
+    'Mathematiques': [
+        'applied mathematics', 'statistical modelling', 'numerical analysis method',
+        'probability stochastic model', 'optimization algorithm', 'operations research',
+        'time series forecasting', 'differential equations'
+    ],
+    'Process Control': [
+        'industrial production planning', 'supply chain logistics', 'quality management',
+        'lean manufacturing', 'process optimization', 'inventory management warehouse',
+        'industrial maintenance', 'operations scheduling', 'process control regulation',
+        'PID controller tuning', 'SCADA supervision'
+    ],
+    'Industrial Design': [
+        'product design', 'industrial design', 'ergonomics workstation', 'prototype 3D printing',
+        'packaging design', 'user experience product', 'design concept sketch'
+    ]
+}
+
+# Rows per partial_fit call when learning from a spreadsheet
+TOPIC_TRAINING_CHUNK_SIZE = int(os.getenv("TOPIC_TRAINING_CHUNK_SIZE", "1000"))
+
+
+class TopicClassifier:
+    """Department of a free-text project topic.
+
+    Features come from a stateless HashingVectorizer (no vocabulary in
+    memory) and the Naive Bayes model is trained incrementally with
+    partial_fit, first on TOPIC_SEED_DATA, then on labelled spreadsheets.
+    """
+
+    def __init__(self, seed_data=TOPIC_SEED_DATA, artifact_dir=ARTIFACT_DIR):
+        self.seed_data = seed_data
+        self.departments = sorted(seed_data)
+        self.artifact_dir = artifact_dir
+        self._lock = threading.Lock()
+        self._vectorizer = None
+        self._model = None
+        self.trained_rows = 0
+        self.seed_version = hashlib.sha1(
+            json.dumps(seed_data, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+
+    @property
+    def version(self):
+        # trained_rows is only known once the saved model is loaded
+        if self._model is None:
+            with self._lock:
+                self._ensure_model()
+        return f"topic-{self.seed_version}-{self.trained_rows}"
+
+    def artifact_path(self):
+        return os.path.join(self.artifact_dir, f"topic_classifier-{self.seed_version}.pkl")
+
+    def _ensure_model(self):
+        """Load the saved model or train on the seed data (call with the lock held)"""
+        if self._model is not None:
+            return
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        self._vectorizer = HashingVectorizer(
+            n_features=2 ** 18,
+            ngram_range=(1, 2),
+            alternate_sign=False,  # Naive Bayes needs non-negative features
+            strip_accents='unicode',
+            lowercase=True
+        )
+        try:
+            with open(self.artifact_path(), 'rb') as f:
+                artifact = pickle.load(f)
+            self._model = artifact['model']
+            self.trained_rows = artifact['trained_rows']
+            logger.info(f"Loaded topic classifier {self.version}")
+            return
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable topic classifier artifact: {str(e)}")
+
+        self._model = MultinomialNB(alpha=0.1)
+        topics = [topic for dept in self.departments for topic in self.seed_data[dept]]
+        labels = [dept for dept in self.departments for _ in self.seed_data[dept]]
+        self._model.partial_fit(self._vectorizer.transform(topics), labels, classes=self.departments)
+        self.trained_rows = 0
+
+    def _save(self):
+        try:
+            os.makedirs(self.artifact_dir, exist_ok=True)
+            path = self.artifact_path()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'model': self._model, 'trained_rows': self.trained_rows}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save topic classifier artifact: {str(e)}")
+
+    def partial_fit(self, topics, departments, save=True):
+        """Learn from one chunk of labelled topics; unknown departments are skipped"""
+        pairs = [
+            (str(topic), canonical_department(department)) for topic, department in zip(topics, departments)
+            if canonical_department(department) in self.departments and topic is not None
+        ]
+        with self._lock:
+            self._ensure_model()
+            if pairs:
+                self._model.partial_fit(
+                    self._vectorizer.transform([topic for topic, _ in pairs]),
+                    [department for _, department in pairs]
+                )
+                self.trained_rows += len(pairs)
+                if save:
+                    self._save()
+        return len(pairs)
+
+    def train_from_excel(self, file_path, topic_column='Sujet', label_column='Departement',
+                         code_column='codeSujet', chunk_size=TOPIC_TRAINING_CHUNK_SIZE):
+        """Learn from a year's uploaded spreadsheet (e.g. pfe_data.xlsx), chunk by chunk.
+
+        Labels come from label_column when the sheet has one, otherwise
+        from the codeSujet patterns (rows whose code matches none are
+        skipped). Rows are streamed with openpyxl in read-only mode; returns
+        the number of rows learned.
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+            if label_column in header:
+                label_index = header.index(label_column)
+                label = lambda row: row[label_index]
+            elif code_column in header:
+                code_index = header.index(code_column)
+                label = lambda row: classifier.extract_dept_code(row[code_index]) if row[code_index] else None
+            else:
+                label = None
+            if topic_column not in header or label is None:
+                logger.warning(
+                    f"{file_path} has no '{topic_column}' column or no '{label_column}'/'{code_column}' "
+                    "column, nothing to learn"
+                )
+                return 0
+            topic_index = header.index(topic_column)
+
+            learned = 0
+            while True:
+                chunk = [row for _, row in zip(range(chunk_size), rows)]
+                if not chunk:
+                    break
+                learned += self.partial_fit([row[topic_index] for row in chunk], [label(row) for row in chunk],
+                                            save=False)
+        finally:
+            workbook.close()
+
+        with self._lock:
+            self._save()
+        logger.info(f"Topic classifier learned {learned} rows from {file_path}")
+        return learned
+
+    def classify_many_with_confidence(self, topics):
+        """
+        Classify a batch (e.g. a whole DataFrame column) of topics
+        Returns a list of (department name, confidence) in input order
+        """
+        topics = ['' if topic is None else str(topic) for topic in topics]
+        if not topics:
+            return []
+        with self._lock:
+            self._ensure_model()
+            probabilities = self._model.predict_proba(self._vectorizer.transform(topics))
+            classes = self._model.classes_
+        best = probabilities.argmax(axis=1)
+        logger.info(f"Classified {len(topics)} topics")
+        return [
+            (classes[column], float(row[column]))
+            for row, column in zip(probabilities, best)
+        ]
+
+    def classify_many(self, topics):
+        return [department for department, _ in self.classify_many_with_confidence(topics)]
+
+    def classify_with_confidence(self, topic):
+        return self.classify_many_with_confidence([topic])[0]
+
+    def classify_project(self, topic):
+        return self.classify_with_confidence(topic)[0]
+
+# Shared topic-text classifier, used by PFEScheduler
+topic_classifier = TopicClassifier()
+
 def read_training_data(file_path):
     """Read and process Excel file for training data"""
     try:
@@ -126,6 +607,15 @@ def read_training_data(file_path):
         return []
 
 if __name__ == "__main__":
+    import sys
+
+    # python project_classifier.py --train-topics pfe_data.xlsx [...]
+    if len(sys.argv) > 2 and sys.argv[1] == "--train-topics":
+        for path in sys.argv[2:]:
+            learned = topic_classifier.train_from_excel(path)
+            print(f"{path}: learned {learned} labelled topics")
+        sys.exit(0)
+
     # Try to read from Excel file
     training_data = read_training_data("attached_assets/liste-SFE-22_23.xlsx")
     
@@ -1,12 +1,11 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import os
 from dotenv import load_dotenv
 import json
 import logging
+from db import get_cursor
+from room_occupancy import build_occupancy_matrix, block_utilization, idle_rooms, double_bookings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,25 +14,16 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def get_db_connection():
-    """Get database connection using environment variables"""
-    return psycopg2.connect(
-        host=os.getenv("PGHOST","aws-0-eu-central-1.pooler.supabase.com"),
-        database=os.getenv("PGDATABASE","postgres"),
-        user=os.getenv("PGUSER","postgres.lvonpafzqjfxqenzvjth"),
-        password=os.getenv("PGPASSWORD","trtrtr123"),
-        port=os.getenv("PGPORT","5432")
-    )
-
 def display_room_management():
     """Display the room management interface in Streamlit"""
     st.title("Room Management")
 
     # Tabs for different room management functions
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "Room Configuration",
         "Room Bookings",
-        "Room Status"
+        "Room Status",
+        "Room Utilization"
     ])
 
     with tab1:
@@ -54,41 +44,27 @@ def display_room_management():
                 )
 
             if st.form_submit_button("Add/Update Room"):
-                conn = None
-                cur = None
                 try:
-                    conn = get_db_connection()
-                    cur = conn.cursor()
-
-                    cur.execute("""
-                        INSERT INTO rooms (room_id, capacity, equipment)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (room_id) 
-                        DO UPDATE SET
-                            capacity = EXCLUDED.capacity,
-                            equipment = EXCLUDED.equipment
-                    """, (room_id, capacity, json.dumps(equipment)))
-
-                    conn.commit()
+                    with get_cursor() as cur:
+                        cur.execute("""
+                            INSERT INTO rooms (room_id, capacity, equipment)
+                            VALUES (%s, %s, %s)
+                            ON CONFLICT (room_id) 
+                            DO UPDATE SET
+                                capacity = EXCLUDED.capacity,
+                                equipment = EXCLUDED.equipment
+                        """, (room_id, capacity, json.dumps(equipment)))
+
                     st.success("Room configuration updated successfully!")
 
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
-                finally:
-                    if cur is not None:
-                        cur.close()
-                    if conn is not None:
-                        conn.close()
 
         # Display existing rooms
-        conn = None
-        cur = None
         try:
-            conn = get_db_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-
-            cur.execute("SELECT * FROM rooms ORDER BY room_id")
-            rooms = cur.fetchall()
+            with get_cursor(dict_rows=True) as cur:
+                cur.execute("SELECT * FROM rooms ORDER BY room_id")
+                rooms = cur.fetchall()
 
             if rooms:
                 st.subheader("Existing Rooms")
@@ -97,11 +73,6 @@ def display_room_management():
 
         except Exception as e:
             st.error(f"Error loading rooms: {str(e)}")
-        finally:
-            if cur is not None:
-                cur.close()
-            if conn is not None:
-                conn.close()
 
     with tab2:
         st.header("Room Bookings")
@@ -112,12 +83,9 @@ def display_room_management():
 
             with col1:
                 # Get available rooms
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute("SELECT room_id FROM rooms ORDER BY room_id")
-                available_rooms = [r[0] for r in cur.fetchall()]
-                cur.close()
-                conn.close()
+                with get_cursor() as cur:
+                    cur.execute("SELECT room_id FROM rooms ORDER BY room_id")
+                    available_rooms = [r[0] for r in cur.fetchall()]
 
                 selected_room = st.selectbox("Select Room", available_rooms if available_rooms else ["No rooms available"])
                 booking_date = st.date_input("Date")
@@ -136,58 +104,44 @@ def display_room_management():
                 start_datetime = datetime.combine(booking_date, start_time)
                 end_datetime = datetime.combine(booking_date, end_time)
 
-                conn = None
-                cur = None
                 try:
-                    conn = get_db_connection()
-                    cur = conn.cursor()
-
-                    # Check for conflicts
-                    cur.execute("""
-                        SELECT COUNT(*) FROM room_bookings 
-                        WHERE room_id = %s 
-                        AND (
-                            (start_time <= %s AND end_time > %s)
-                            OR (start_time < %s AND end_time >= %s)
-                            OR (start_time >= %s AND end_time <= %s)
-                        )
-                    """, (selected_room, start_datetime, start_datetime, 
-                          end_datetime, end_datetime, start_datetime, end_datetime))
-
-                    if cur.fetchone()[0] > 0:
-                        st.error("Room is already booked for this time slot")
-                    else:
+                    with get_cursor() as cur:
+                        # Check for conflicts
                         cur.execute("""
-                            INSERT INTO room_bookings 
-                            (room_id, start_time, end_time, event_type, attendees, equipment_needed)
-                            VALUES (%s, %s, %s, %s, %s, %s)
-                        """, (selected_room, start_datetime, end_datetime, 
-                              event_type, attendees, json.dumps(equipment_needed)))
-
-                        conn.commit()
-                        st.success("Booking added successfully!")
+                            SELECT COUNT(*) FROM room_bookings 
+                            WHERE room_id = %s 
+                            AND (
+                                (start_time <= %s AND end_time > %s)
+                                OR (start_time < %s AND end_time >= %s)
+                                OR (start_time >= %s AND end_time <= %s)
+                            )
+                        """, (selected_room, start_datetime, start_datetime, 
+                              end_datetime, end_datetime, start_datetime, end_datetime))
+
+                        if cur.fetchone()[0] > 0:
+                            st.error("Room is already booked for this time slot")
+                        else:
+                            cur.execute("""
+                                INSERT INTO room_bookings 
+                                (room_id, start_time, end_time, event_type, attendees, equipment_needed)
+                                VALUES (%s, %s, %s, %s, %s, %s)
+                            """, (selected_room, start_datetime, end_datetime, 
+                                  event_type, attendees, json.dumps(equipment_needed)))
+
+                            st.success("Booking added successfully!")
 
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
-                finally:
-                    if cur is not None:
-                        cur.close()
-                    if conn is not None:
-                        conn.close()
 
         # Display bookings
-        conn = None
-        cur = None
         try:
-            conn = get_db_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-
-            cur.execute("""
-                SELECT * FROM room_bookings 
-                WHERE start_time >= CURRENT_DATE 
-                ORDER BY start_time
-            """)
-            bookings = cur.fetchall()
+            with get_cursor(dict_rows=True) as cur:
+                cur.execute("""
+                    SELECT * FROM room_bookings 
+                    WHERE start_time >= CURRENT_DATE 
+                    ORDER BY start_time
+                """)
+                bookings = cur.fetchall()
 
             if bookings:
                 st.subheader("Upcoming Bookings")
@@ -196,24 +150,15 @@ def display_room_management():
 
         except Exception as e:
             st.error(f"Error loading bookings: {str(e)}")
-        finally:
-            if cur is not None:
-                cur.close()
-            if conn is not None:
-                conn.close()
 
     with tab3:
         st.header("Room Status")
 
         # Update room status
-        conn = None
-        cur = None
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-
-            cur.execute("SELECT room_id FROM rooms ORDER BY room_id")
-            available_rooms = [r[0] for r in cur.fetchall()]
+            with get_cursor() as cur:
+                cur.execute("SELECT room_id FROM rooms ORDER BY room_id")
+                available_rooms = [r[0] for r in cur.fetchall()]
 
             if available_rooms:
                 col1, col2 = st.columns(2)
@@ -235,15 +180,15 @@ def display_room_management():
 
                 if st.button("Update Status"):
                     try:
-                        cur.execute("""
-                            UPDATE rooms 
-                            SET status = %s,
-                                last_maintenance = %s,
-                                notes = %s
-                            WHERE room_id = %s
-                        """, (room_status, maintenance_date, notes, selected_room))
-
-                        conn.commit()
+                        with get_cursor() as cur:
+                            cur.execute("""
+                                UPDATE rooms 
+                                SET status = %s,
+                                    last_maintenance = %s,
+                                    notes = %s
+                                WHERE room_id = %s
+                            """, (room_status, maintenance_date, notes, selected_room))
+
                         st.success("Room status updated successfully!")
 
                     except Exception as e:
@@ -253,11 +198,48 @@ def display_room_management():
 
         except Exception as e:
             st.error(f"Error: {str(e)}")
-        finally:
-            if cur is not None:
-                cur.close()
-            if conn is not None:
-                conn.close()
+
+    with tab4:
+        st.header("Room Utilization")
+
+        # Active schedule (cached per version) as a room x slot matrix
+        from schedule_store import load_active_schedule
+        schedule = load_active_schedule()
+        if schedule:
+            display_room_occupancy(build_occupancy_matrix(schedule))
+        else:
+            st.info("No schedule has been generated yet.")
+
+def display_room_occupancy(occupancy):
+    """Heatmap, per-block utilization and idle rooms of an occupancy matrix"""
+    import plotly.express as px
+
+    if not occupancy.slots:
+        st.info("No scheduled presentations.")
+        return
+
+    utilization = block_utilization(occupancy)
+    columns = st.columns(len(utilization))
+    for column, (block, share) in zip(columns, utilization.items()):
+        column.metric(f"Block {block}", f"{share:.0%}")
+
+    fig = px.imshow(
+        occupancy.matrix,
+        x=occupancy.slots,
+        y=occupancy.rooms,
+        aspect="auto",
+        color_continuous_scale="Blues",
+        labels={'x': "Slot", 'y': "Room", 'color': "Presentations"}
+    )
+    fig.update_layout(height=max(400, 14 * len(occupancy.rooms)))
+    st.plotly_chart(fig, use_container_width=True)
+
+    idle = idle_rooms(occupancy)
+    st.write(f"Idle rooms ({len(idle)}): " + (", ".join(idle) if idle else "none"))
+
+    conflicts = double_bookings(occupancy)
+    if conflicts:
+        st.warning("Double-booked: " + ", ".join(f"{room} at {slot}" for room, slot in conflicts))
 
 if __name__ == "__main__":
     display_room_management()
\ No newline at end of file
@@ -0,0 +1,50 @@
+from collections import namedtuple
+import numpy as np
+
+# Room blocks and rooms per block of the faculty (same as PFEScheduler)
+ROOM_BLOCKS = ('I', 'K', 'M', 'G')
+ROOMS_PER_BLOCK = 21
+
+# matrix[i, j] = presentations in rooms[i] during slots[j] (more than 1 is a double booking)
+Occupancy = namedtuple('Occupancy', ['rooms', 'slots', 'matrix'])
+
+def all_rooms():
+    return [f"{block}{number:02d}" for block in ROOM_BLOCKS for number in range(1, ROOMS_PER_BLOCK + 1)]
+
+def build_occupancy_matrix(schedule, rooms=None):
+    """Dense room x slot matrix from export_schedule() style rows.
+
+    Rows are the given rooms (all faculty rooms by default, plus any room
+    found in the schedule), columns the distinct 'date' values in order.
+    """
+    dates = np.array([item['date'] for item in schedule], dtype=object)
+    used_rooms = np.array([item['room'] for item in schedule], dtype=object)
+
+    room_axis = np.array(sorted(set(all_rooms() if rooms is None else rooms) | set(used_rooms)), dtype=object)
+    slots, slot_index = np.unique(dates.astype(str), return_inverse=True)
+    room_index = np.searchsorted(room_axis, used_rooms)
+
+    matrix = np.zeros((len(room_axis), len(slots)), dtype=np.int16)
+    np.add.at(matrix, (room_index, slot_index), 1)
+    return Occupancy(list(room_axis), list(slots), matrix)
+
+def block_utilization(occupancy):
+    """Share of (room, slot) cells in use, per room block (first letter)"""
+    if not occupancy.slots:
+        return {}
+    blocks = np.array([room[0] for room in occupancy.rooms])
+    busy = occupancy.matrix > 0
+    return {
+        block: float(busy[blocks == block].mean())
+        for block in sorted(set(blocks))
+    }
+
+def idle_rooms(occupancy):
+    """Rooms with no presentation in any slot"""
+    idle = ~occupancy.matrix.any(axis=1)
+    return [room for room, is_idle in zip(occupancy.rooms, idle) if is_idle]
+
+def double_bookings(occupancy):
+    """(room, slot) pairs holding more than one presentation"""
+    rows, columns = np.nonzero(occupancy.matrix > 1)
+    return [(occupancy.rooms[i], occupancy.slots[j]) for i, j in zip(rows, columns)]
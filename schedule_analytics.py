@@ -0,0 +1,57 @@
+from collections import Counter, defaultdict
+
+# Jury roles of the formatted schedule rows (same keys as schedule_store.ROW_FIELDS)
+JURY_ROLES = ('President', 'Rapporteur', 'Supervisor')
+
+def build_analytics_snapshot(schedule_data):
+    """Compact aggregates of one formatted schedule, stored with its version.
+
+    Every value is JSON-serializable: counts per department, room and day,
+    room utilization over the schedule's time slots, supervisor and jury
+    participation, and the number of days each professor is on campus.
+    """
+    departments = Counter()
+    rooms = Counter()
+    days = Counter()
+    slots = set()
+    jury = defaultdict(Counter)
+    professor_days = defaultdict(set)
+
+    for item in schedule_data:
+        date_time = str(item['Date & Time'])
+        day = date_time[:10]
+        departments[item.get('Department') or 'Unclassified'] += 1
+        rooms[item['Room']] += 1
+        days[day] += 1
+        slots.add(date_time)
+        for role in JURY_ROLES:
+            name = item.get(role)
+            if name:
+                name = str(name).strip()
+                jury[name][role] += 1
+                professor_days[name].add(day)
+
+    slot_count = len(slots)
+    total = sum(rooms.values())
+    return {
+        'totals': {
+            'presentations': total,
+            'rooms': len(rooms),
+            'slots': slot_count,
+            'days': len(days),
+            'professors': len(jury),
+            # Share of (used room, slot) pairs that hold a presentation
+            'room_utilization': round(total / (len(rooms) * slot_count), 4) if slot_count else 0.0
+        },
+        'departments': dict(sorted(departments.items())),
+        'rooms': {
+            room: {'presentations': count, 'utilization': round(count / slot_count, 4)}
+            for room, count in sorted(rooms.items())
+        },
+        'days': dict(sorted(days.items())),
+        'supervisors': {
+            name: counts['Supervisor'] for name, counts in sorted(jury.items()) if counts['Supervisor']
+        },
+        'jury': {name: dict(counts) for name, counts in sorted(jury.items())},
+        'professor_days': {name: len(dates) for name, dates in sorted(professor_days.items())}
+    }
@@ -0,0 +1,56 @@
+import csv
+import html
+
+# Column order shared by every export format (same as the PDF table)
+EXPORT_COLUMNS = [
+    'Date & Time', 'Department', 'Topic', 'Student', 'Room',
+    'President', 'Rapporteur', 'Supervisor'
+]
+
+def iter_export_rows(schedule):
+    """Yield one tuple per presentation from export_schedule() style rows"""
+    for item in schedule:
+        jury_dict = {j['role']: j['name'] for j in item['jury']}
+        yield (
+            item['date'],
+            item.get('department', ''),
+            item['topic'],
+            item['student'],
+            item['room'],
+            jury_dict.get('President', ''),
+            jury_dict.get('Rapporteur', ''),
+            jury_dict.get('Supervisor', '')
+        )
+
+def write_schedule_csv(schedule, buffer, delimiter=','):
+    """Write the schedule as CSV (or TSV with delimiter='\\t') into a text buffer"""
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(iter_export_rows(schedule))
+    return buffer
+
+def write_schedule_html(schedule, buffer, title="Planning des Soutenances PFE"):
+    """Write the schedule as a static HTML page into a text buffer"""
+    escape = html.escape
+    buffer.write(
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+        f"<title>{escape(title)}</title>"
+        "<style>"
+        "body{font-family:Helvetica,Arial,sans-serif}"
+        "table{border-collapse:collapse;width:100%}"
+        "th,td{border:1px solid #000;padding:6px;text-align:center}"
+        "th{background:#808080;color:#f5f5f5}"
+        "tr:nth-child(even){background:#d3d3d3}"
+        "</style></head><body>\n"
+        f"<h1>{escape(title)}</h1>\n<table>\n<thead><tr>"
+    )
+    buffer.write("".join(f"<th>{escape(column)}</th>" for column in EXPORT_COLUMNS))
+    buffer.write("</tr></thead>\n<tbody>\n")
+
+    count = 0
+    for row in iter_export_rows(schedule):
+        buffer.write("<tr><td>" + "</td><td>".join(escape(str(value)) for value in row) + "</td></tr>\n")
+        count += 1
+
+    buffer.write(f"</tbody>\n</table>\n<p>Total Presentations: {count}</p>\n</body></html>\n")
+    return buffer
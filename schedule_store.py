@@ -0,0 +1,569 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from db import get_cursor, copy_rows, in_clause, iter_row_chunks, read_frame, backend_name
+from schedule_analytics import build_analytics_snapshot
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns of the presentations table and the matching keys of the formatted
+# schedule rows built in app.py, followed by the jury roles
+PRESENTATION_COLUMNS = ('date_time', 'topic', 'student', 'room')
+JURY_ROLES = ('President', 'Rapporteur', 'Supervisor')
+ROW_FIELDS = ('Date & Time', 'Topic', 'Student', 'Room') + JURY_ROLES
+
+# Fields whose change moves a calendar event (bumps its iCal SEQUENCE)
+EVENT_FIELDS = ('Date & Time', 'Room') + JURY_ROLES
+
+# Optional classification keys of the formatted rows, stored next to the
+# presentation but not part of its fingerprint (a row whose classification
+# alone changed is updated in place)
+CLASSIFICATION_FIELDS = ('Department', 'Classifier Version', 'Confidence', 'Subject Code')
+CLASSIFICATION_COLUMNS = ('department', 'classifier_version', 'confidence', 'subject_code')
+
+# Rows classified per round-trip by backfill_classifications()
+BACKFILL_BATCH_SIZE = int(os.getenv("CLASSIFICATION_BACKFILL_BATCH", "500"))
+
+# How long a process trusts its cached active version before re-reading the
+# pointer row (saves and activations in this process update it immediately)
+VERSION_CHECK_INTERVAL = float(os.getenv("SCHEDULE_VERSION_TTL", "5"))
+
+# Cached schedules and per-user views kept at most (least recently used
+# ones are dropped first)
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "1024"))
+
+# Ids or names per IN (...) list (stays under SQLite's parameter limit)
+IN_BATCH_SIZE = 500
+
+
+class ScheduleCache:
+    """Process-wide cache of the active schedule and its per-user views.
+
+    Entries belong to one schedule version and are dropped as soon as another
+    version becomes active; within a version at most maxsize entries are
+    kept, in LRU order. Cached values are shared between sessions and must
+    be treated as read-only.
+    """
+
+    def __init__(self, check_interval, maxsize=SCHEDULE_CACHE_SIZE):
+        self.lock = threading.Lock()
+        self.check_interval = check_interval
+        self.maxsize = maxsize
+        self.version = None
+        self.checked_at = 0.0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                self.entries = OrderedDict()
+                self.version = version
+            self.checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.version = None
+
+    def current_version(self):
+        with self.lock:
+            if self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+                return self.version
+        version = get_active_version()
+        self.set_version(version)
+        return version
+
+    def get(self, key, build):
+        version = self.current_version()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        value = build()
+        with self.lock:
+            # Don't store a value built from a version that is no longer active
+            if self.version == version:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return value
+
+schedule_cache = ScheduleCache(VERSION_CHECK_INTERVAL)
+
+def normalize_name(name):
+    """Trim, collapse inner whitespace and lowercase a person's name"""
+    return re.sub(r'\s+', ' ', str(name).strip()).lower()
+
+def lookup_name(name):
+    """Parameter for the student name index and professors.name_key"""
+    return str(name).strip().lower()
+
+def presentation_key(student, occurrence=1):
+    """Stable key of a presentation across schedule versions (one per student)"""
+    name = normalize_name(student)
+    if occurrence > 1:
+        name = f"{name}#{occurrence}"
+    return hashlib.md5(name.encode('utf-8')).hexdigest()
+
+def row_hash(values):
+    """Fingerprint of the presentation fields, used to detect changed rows"""
+    return hashlib.md5('\x1f'.join(str(v) for v in values).encode('utf-8')).hexdigest()
+
+def _query_active_schedule():
+    # Stream tuples in chunks instead of materializing one dict per row
+    schedule_data = []
+    for _, rows in iter_row_chunks("""
+        SELECT date_time, topic, student, room, president, rapporteur, supervisor, department
+        FROM active_schedules 
+        ORDER BY date_time
+    """):
+        for date_time, topic, student, room, president, rapporteur, supervisor, department in rows:
+            schedule_data.append({
+                'date': date_time.strftime('%Y-%m-%d %H:%M'),
+                'topic': topic,
+                'student': student,
+                'room': room,
+                'jury': [
+                    {'role': 'President', 'name': president},
+                    {'role': 'Rapporteur', 'name': rapporteur},
+                    {'role': 'Supervisor', 'name': supervisor}
+                ],
+                'department': department or ''
+            })
+    return schedule_data or None
+
+def load_active_schedule():
+    """Whole active schedule in export_schedule() shape, or None (cached)"""
+    return schedule_cache.get('schedule', _query_active_schedule)
+
+def load_student_schedule(student):
+    """Active schedule rows of one student (cached per schedule version)"""
+    name = lookup_name(student)
+    return schedule_cache.get(('student', name), lambda: _query_student_schedule(name))
+
+def load_professor_schedule(professor):
+    """Active schedule rows where a professor sits on the jury (cached)"""
+    name = lookup_name(professor)
+    return schedule_cache.get(('professor', name), lambda: _query_professor_schedule(name))
+
+def _query_student_schedule(name):
+    """Active schedule rows of one student, via the student_key index"""
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT date_time, topic, room, president, rapporteur, supervisor
+            FROM active_schedules
+            WHERE student_key = %s
+            ORDER BY date_time
+        """, (name,))
+        rows = cur.fetchall()
+
+    return [
+        {
+            'Date & Time': row['date_time'].strftime('%Y-%m-%d %H:%M'),
+            'Topic': row['topic'],
+            'Room': row['room'],
+            'President': row['president'],
+            'Rapporteur': row['rapporteur'],
+            'Supervisor': row['supervisor']
+        }
+        for row in rows
+    ]
+
+def _query_professor_schedule(name):
+    """Active schedule rows of one professor, via the jury_assignments index"""
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT p.date_time, p.topic, p.student, p.room, j.role
+            FROM professors pr
+            JOIN jury_assignments j ON j.professor_id = pr.id
+            JOIN presentations p ON p.id = j.presentation_id
+            JOIN schedule_active a
+              ON p.valid_from <= a.version_id
+             AND (p.valid_to IS NULL OR p.valid_to > a.version_id)
+            WHERE pr.name_key = %s
+            ORDER BY p.date_time
+        """, (name,))
+        rows = cur.fetchall()
+
+    return [
+        {
+            'Date & Time': row['date_time'].strftime('%Y-%m-%d %H:%M'),
+            'Role': row['role'],
+            'Student': row['student'],
+            'Topic': row['topic'],
+            'Room': row['room']
+        }
+        for row in rows
+    ]
+
+def get_active_version():
+    with get_cursor() as cur:
+        cur.execute("SELECT version_id FROM schedule_active")
+        row = cur.fetchone()
+    return row[0] if row else 0
+
+# Breakdowns of the active schedule returned by load_schedule_aggregates()
+AGGREGATE_DIMENSIONS = ('department', 'room', 'day')
+
+def load_schedule_aggregates():
+    """Presentation counts per department, room and day (cached per version).
+
+    Returns {'department': [(name, count)], 'room': [...], 'day': [(date, count)]},
+    each sorted by key. Postgres computes all three in one GROUPING SETS
+    query; the embedded SQLite backend groups with pandas.
+    """
+    return schedule_cache.get('aggregates', _query_schedule_aggregates)
+
+def _query_schedule_aggregates():
+    if backend_name() != 'postgres':
+        return _aggregate_with_pandas()
+
+    aggregates = {dimension: [] for dimension in AGGREGATE_DIMENSIONS}
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT CASE
+                       WHEN GROUPING(department) = 0 THEN 'department'
+                       WHEN GROUPING(room) = 0 THEN 'room'
+                       ELSE 'day'
+                   END AS dimension,
+                   department, room, day, COUNT(*) AS presentations
+            FROM (
+                SELECT COALESCE(p.department, 'Unclassified') AS department,
+                       p.room,
+                       CAST(p.date_time AS DATE) AS day
+                FROM presentations p
+                JOIN schedule_active a
+                  ON p.valid_from <= a.version_id
+                 AND (p.valid_to IS NULL OR p.valid_to > a.version_id)
+            ) AS active
+            GROUP BY GROUPING SETS ((department), (room), (day))
+            ORDER BY dimension, department, room, day
+        """)
+        for dimension, department, room, day, count in cur.fetchall():
+            key = {'department': department, 'room': room, 'day': day}[dimension]
+            aggregates[dimension].append((key, count))
+    return aggregates
+
+def _aggregate_with_pandas():
+    df = read_frame("""
+        SELECT COALESCE(department, 'Unclassified') AS department, room, date_time
+        FROM presentations p
+        JOIN schedule_active a
+          ON p.valid_from <= a.version_id
+         AND (p.valid_to IS NULL OR p.valid_to > a.version_id)
+    """)
+    if df.empty:
+        return {dimension: [] for dimension in AGGREGATE_DIMENSIONS}
+    df['day'] = df['date_time'].dt.date
+    return {
+        dimension: [(key, int(count)) for key, count in df.groupby(dimension).size().items()]
+        for dimension in AGGREGATE_DIMENSIONS
+    }
+
+def load_professor_workload():
+    """Presentations per professor and jury role in the active version"""
+    return schedule_cache.get('workload', _query_professor_workload)
+
+def _query_professor_workload():
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT pr.name AS professor, j.role, COUNT(*) AS presentations
+            FROM jury_assignments j
+            JOIN professors pr ON pr.id = j.professor_id
+            JOIN presentations p ON p.id = j.presentation_id
+            JOIN schedule_active a
+              ON p.valid_from <= a.version_id
+             AND (p.valid_to IS NULL OR p.valid_to > a.version_id)
+            GROUP BY pr.name, j.role
+            ORDER BY pr.name, j.role
+        """)
+        return cur.fetchall()
+
+def _decode_snapshot(value):
+    # JSONB comes back decoded from Postgres, TEXT from SQLite
+    return json.loads(value) if isinstance(value, str) else value
+
+def load_analytics_snapshot():
+    """Analytics snapshot of the active version, or None if it was saved without one"""
+    return schedule_cache.get('analytics_snapshot', _query_analytics_snapshot)
+
+def _query_analytics_snapshot():
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT s.snapshot
+            FROM schedule_analytics s
+            JOIN schedule_active a ON s.version_id = a.version_id
+        """)
+        row = cur.fetchone()
+    return _decode_snapshot(row[0]) if row else None
+
+def list_analytics_snapshots():
+    """(version id, saved at, snapshot) of every version, newest first"""
+    with get_cursor() as cur:
+        cur.execute("""
+            SELECT version_id, created_at, snapshot
+            FROM schedule_analytics
+            ORDER BY version_id DESC
+        """)
+        return [
+            (version_id, created_at, _decode_snapshot(snapshot))
+            for version_id, created_at, snapshot in cur.fetchall()
+        ]
+
+def list_schedule_versions():
+    with get_cursor(dict_rows=True) as cur:
+        cur.execute("""
+            SELECT v.*, (v.id = a.version_id) AS active
+            FROM schedule_versions v
+            CROSS JOIN schedule_active a
+            ORDER BY v.id DESC
+        """)
+        return cur.fetchall()
+
+def activate_schedule_version(version_id):
+    """Point readers at another version (instant rollback)"""
+    with get_cursor() as cur:
+        cur.execute("SELECT 1 FROM schedule_versions WHERE id = %s", (version_id,))
+        if cur.fetchone() is None:
+            raise ValueError(f"Unknown schedule version {version_id}")
+        cur.execute("UPDATE schedule_active SET version_id = %s", (version_id,))
+
+    schedule_cache.set_version(version_id)
+
+def _professor_ids(cur, names):
+    """Ids of the professors with these display names, adding missing ones"""
+    wanted = {}
+    for name in names:
+        key = lookup_name(name)
+        if key:
+            wanted.setdefault(key, name.strip())
+
+    ids = {}
+    keys = list(wanted)
+    for start in range(0, len(keys), IN_BATCH_SIZE):
+        clause, params = in_clause('name_key', keys[start:start + IN_BATCH_SIZE])
+        cur.execute(f"SELECT name_key, id FROM professors WHERE {clause}", params)
+        ids.update(cur.fetchall())
+
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        copy_rows(cur, 'professors', ('name', 'name_key'), ((wanted[key], key) for key in missing))
+        for start in range(0, len(missing), IN_BATCH_SIZE):
+            clause, params = in_clause('name_key', missing[start:start + IN_BATCH_SIZE])
+            cur.execute(f"SELECT name_key, id FROM professors WHERE {clause}", params)
+            ids.update(cur.fetchall())
+    return ids
+
+def _write_presentations(cur, version_id, to_write, events, classifications):
+    """Bulk load new presentation rows and their jury assignments"""
+    copy_rows(
+        cur,
+        'presentations',
+        PRESENTATION_COLUMNS + ('student_key', 'presentation_key', 'row_hash', 'revision', 'valid_from',
+                                'event_hash', 'event_sequence')
+        + CLASSIFICATION_COLUMNS,
+        (values[:len(PRESENTATION_COLUMNS)]
+         + (lookup_name(values[PRESENTATION_COLUMNS.index('student')]), key, fingerprint, revision, version_id)
+         + events[key] + classifications[key]
+         for key, values, fingerprint, revision in to_write)
+    )
+
+    # Every row written by this save starts at the new version
+    cur.execute(
+        "SELECT presentation_key, id FROM presentations WHERE valid_from = %s AND valid_to IS NULL",
+        (version_id,)
+    )
+    presentation_ids = dict(cur.fetchall())
+
+    jury = [
+        (key, role, name)
+        for key, values, _, _ in to_write
+        for role, name in zip(JURY_ROLES, values[len(PRESENTATION_COLUMNS):])
+        if name and lookup_name(name)
+    ]
+    professor_ids = _professor_ids(cur, [name for _, _, name in jury])
+    copy_rows(
+        cur,
+        'jury_assignments',
+        ('presentation_id', 'professor_id', 'role'),
+        ((presentation_ids[key], professor_ids[lookup_name(name)], role) for key, role, name in jury)
+    )
+
+def save_schedule_version(schedule_data):
+    """Store a generated schedule as a new version, writing only the diff.
+
+    The new rows are compared by presentation key and row hash with the
+    newest version's rows (the active one unless an older version was
+    reactivated). Deleted and changed rows are closed, inserted and changed
+    rows are bulk loaded, rows whose classification alone changed are
+    updated in place, then the active pointer moves to the new version, all
+    in one transaction.
+
+    Returns a dict with the new version id and the inserted, changed and
+    deleted presentation keys.
+    """
+    # Key and fingerprint the new rows
+    new_rows = {}
+    event_hashes = {}
+    classifications = {}
+    occurrences = {}
+    for item in schedule_data:
+        values = tuple(item[field] for field in ROW_FIELDS)
+        student = normalize_name(item['Student'])
+        occurrences[student] = occurrences.get(student, 0) + 1
+        key = presentation_key(item['Student'], occurrences[student])
+        new_rows[key] = (values, row_hash(values))
+        event_hashes[key] = row_hash(tuple(item[field] for field in EVENT_FIELDS))
+        classifications[key] = tuple(item.get(field) for field in CLASSIFICATION_FIELDS)
+
+    with get_cursor() as cur:
+        # Serialize concurrent writers on the pointer row (a no-op write
+        # locks it on Postgres and takes the write lock on SQLite)
+        cur.execute("UPDATE schedule_active SET version_id = version_id")
+
+        cur.execute("""
+            SELECT id, presentation_key, row_hash, revision, event_hash, event_sequence,
+                   department, classifier_version, subject_code
+            FROM presentations
+            WHERE valid_to IS NULL
+        """)
+        previous = {}
+        close_ids = []
+        for row_id, key, fingerprint, revision, event_hash, sequence, *classification in cur.fetchall():
+            if key in previous:
+                close_ids.append(row_id)  # duplicate legacy row
+            else:
+                previous[key] = (row_id, fingerprint, revision, event_hash, sequence, tuple(classification))
+
+        inserted, changed, deleted = [], [], []
+        to_write = []
+        events = {}
+        reclassified = []
+        for key, (values, fingerprint) in new_rows.items():
+            prev = previous.get(key)
+            if prev is None:
+                inserted.append(key)
+                to_write.append((key, values, fingerprint, 0))
+                events[key] = (event_hashes[key], 0)
+            elif prev[1] != fingerprint:
+                changed.append(key)
+                close_ids.append(prev[0])
+                to_write.append((key, values, fingerprint, prev[2] + 1))
+                # A topic-only edit keeps the calendar event's sequence
+                moved = prev[3] != event_hashes[key]
+                events[key] = (event_hashes[key], prev[4] + 1 if moved else prev[4])
+            else:
+                # Same presentation: keep the row, but store a new
+                # classification if the caller supplied a different one
+                department, version, confidence, code = classifications[key]
+                if version is not None and prev[5] != (department, version, code):
+                    reclassified.append((department, version, confidence, code, prev[0]))
+        for key, (row_id, *_) in previous.items():
+            if key not in new_rows:
+                deleted.append(key)
+                close_ids.append(row_id)
+
+        cur.execute("""
+            INSERT INTO schedule_versions (row_count, inserted, changed, deleted)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        """, (len(new_rows), len(inserted), len(changed), len(deleted)))
+        version_id = cur.fetchone()[0]
+
+        for start in range(0, len(close_ids), IN_BATCH_SIZE):
+            clause, ids = in_clause('id', close_ids[start:start + IN_BATCH_SIZE])
+            cur.execute(f"UPDATE presentations SET valid_to = %s WHERE {clause}", [version_id] + ids)
+        if to_write:
+            _write_presentations(cur, version_id, to_write, events, classifications)
+        if reclassified:
+            cur.executemany("""
+                UPDATE presentations
+                SET department = %s, classifier_version = %s, confidence = %s, subject_code = %s
+                WHERE id = %s
+            """, reclassified)
+
+        cur.execute(
+            "INSERT INTO schedule_analytics (version_id, snapshot) VALUES (%s, %s)",
+            (version_id, json.dumps(build_analytics_snapshot(schedule_data)))
+        )
+
+        cur.execute("UPDATE schedule_active SET version_id = %s", (version_id,))
+
+    schedule_cache.set_version(version_id)
+    logger.info(
+        f"Saved schedule version {version_id}: {len(inserted)} inserted, "
+        f"{len(changed)} changed, {len(deleted)} deleted"
+    )
+    return {
+        'version': version_id,
+        'inserted': inserted,
+        'changed': changed,
+        'deleted': deleted
+    }
+
+def backfill_classifications(code_classifier, topic_classifier, batch_size=BACKFILL_BATCH_SIZE):
+    """Reclassify rows whose stored classifier version is missing or stale.
+
+    Each row is reclassified from the input its department was derived
+    from: presentations with a subject code by the code classifier, other
+    presentations (by topic) and student submissions (by project title) by
+    the free-text topic classifier. Rows are walked in id order, one batch
+    per transaction. Returns the number of rows updated.
+    """
+    sources = (
+        ('presentations', 'subject_code', 'subject_code IS NOT NULL', code_classifier),
+        ('presentations', 'topic', 'subject_code IS NULL', topic_classifier),
+        ('student_submissions', 'project_title', 'TRUE', topic_classifier)
+    )
+    updated = 0
+    for table, text_column, condition, classifier in sources:
+        last_id = 0
+        while True:
+            with get_cursor() as cur:
+                cur.execute(f"""
+                    SELECT id, {text_column}
+                    FROM {table}
+                    WHERE id > %s AND {condition}
+                      AND (classifier_version IS NULL OR classifier_version <> %s)
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, classifier.version, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+
+                classified = classifier.classify_many_with_confidence(text for _, text in rows)
+                results = [
+                    (department, classifier.version, confidence, row_id)
+                    for (department, confidence), (row_id, _) in zip(classified, rows)
+                ]
+                cur.executemany(f"""
+                    UPDATE {table}
+                    SET department = %s, classifier_version = %s, confidence = %s
+                    WHERE id = %s
+                """, results)
+
+            updated += len(rows)
+            last_id = rows[-1][0]
+
+    if updated:
+        logger.info(
+            f"Backfilled classifications of {updated} rows "
+            f"(classifiers {code_classifier.version}, {topic_classifier.version})"
+        )
+        # Cached views embed the department
+        schedule_cache.invalidate()
+    return updated
@@ -0,0 +1,413 @@
+import threading
+import logging
+from db import backend_name
+from schedule_store import lookup_name, presentation_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Column types that differ between the storage backends
+TYPES = {
+    'postgres': {'id': 'SERIAL PRIMARY KEY', 'json': 'JSONB'},
+    'sqlite': {'id': 'INTEGER PRIMARY KEY AUTOINCREMENT', 'json': 'TEXT'}
+}
+
+# Values of jury_assignments.role, also the column names of the schedules view
+JURY_ROLES = ('President', 'Rapporteur', 'Supervisor')
+
+# Department classification persisted at write time
+CLASSIFICATION_COLUMNS = {
+    'department': 'TEXT',
+    'classifier_version': 'TEXT',
+    'confidence': 'REAL'
+}
+CLASSIFIED_TABLES = ('presentations', 'student_submissions')
+
+# Subject code a presentation's department was derived from (reclassified
+# with the code classifier; rows without one are classified by topic)
+SUBJECT_COLUMNS = {'subject_code': 'TEXT'}
+
+# Student lookup key, computed in Python like professors.name_key (SQLite's
+# lower() only folds ASCII)
+STUDENT_KEY_COLUMNS = {'student_key': 'TEXT'}
+
+# Calendar event revision: fingerprint of time, room and jury, and the iCal
+# SEQUENCE bumped when it changes
+EVENT_COLUMNS = {
+    'event_hash': 'TEXT',
+    'event_sequence': 'INTEGER NOT NULL DEFAULT 0'
+}
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def _create_tables(cur, types):
+    # One row per presentation and schedule version; a row belongs to every
+    # version in [valid_from, valid_to)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS presentations (
+            id {types['id']},
+            date_time TIMESTAMP,
+            topic TEXT,
+            student TEXT,
+            room TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            presentation_key TEXT,
+            row_hash TEXT,
+            revision INTEGER NOT NULL DEFAULT 0,
+            valid_from INTEGER NOT NULL DEFAULT 0,
+            valid_to INTEGER,
+            department TEXT,
+            classifier_version TEXT,
+            confidence REAL,
+            event_hash TEXT,
+            event_sequence INTEGER NOT NULL DEFAULT 0,
+            subject_code TEXT,
+            student_key TEXT
+        )
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS professors (
+            id {types['id']},
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL UNIQUE
+        )
+    """)
+
+    # Jury membership: one row per presentation and role
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jury_assignments (
+            presentation_id INTEGER NOT NULL REFERENCES presentations (id),
+            professor_id INTEGER NOT NULL REFERENCES professors (id),
+            role TEXT NOT NULL,
+            PRIMARY KEY (presentation_id, role)
+        )
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS schedule_versions (
+            id {types['id']},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            row_count INTEGER NOT NULL,
+            inserted INTEGER NOT NULL,
+            changed INTEGER NOT NULL,
+            deleted INTEGER NOT NULL
+        )
+    """)
+
+    # Analytics snapshot computed when a version is saved
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS schedule_analytics (
+            version_id INTEGER PRIMARY KEY REFERENCES schedule_versions (id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            snapshot {types['json']} NOT NULL
+        )
+    """)
+
+    # Single-row pointer to the version readers see
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schedule_active (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version_id INTEGER NOT NULL
+        )
+    """)
+    cur.execute("""
+        INSERT INTO schedule_active (id, version_id) VALUES (TRUE, 0)
+        ON CONFLICT (id) DO NOTHING
+    """)
+
+    # Published iCal feeds: the etag of each participant's feed file in the
+    # last published version ('' is the version's marker row); kept here
+    # rather than next to the files so it follows the database
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ical_feeds (
+            version_id INTEGER NOT NULL,
+            participant TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            PRIMARY KEY (version_id, participant)
+        )
+    """)
+
+    # Last published revision of each calendar event: SEQUENCE and
+    # LAST-MODIFIED only ever grow, even when an older version is activated
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ical_events (
+            presentation_key TEXT PRIMARY KEY,
+            presentation_id INTEGER NOT NULL,
+            event_hash TEXT,
+            sequence INTEGER NOT NULL,
+            modified_at TIMESTAMP NOT NULL
+        )
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS student_submissions (
+            id {types['id']},
+            full_name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            project_title TEXT NOT NULL,
+            supervisor TEXT NOT NULL,
+            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            department TEXT,
+            classifier_version TEXT,
+            confidence REAL
+        )
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS rooms (
+            room_id TEXT PRIMARY KEY,
+            capacity INTEGER,
+            equipment {types['json']},
+            status TEXT DEFAULT 'available',
+            last_maintenance DATE,
+            notes TEXT
+        )
+    """)
+
+    # Outgoing email, drained by the notification_outbox worker; status is
+    # pending, sending, sent or dead (retries exhausted)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id {types['id']},
+            batch TEXT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL,
+            claimed_at TIMESTAMP,
+            sent_at TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS room_bookings (
+            id {types['id']},
+            room_id TEXT REFERENCES rooms (room_id),
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP NOT NULL,
+            event_type TEXT,
+            attendees INTEGER,
+            equipment_needed {types['json']},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _legacy_schedules_table(cur, backend):
+    """True while schedules is still the old denormalized table (not the view)"""
+    if backend == 'postgres':
+        cur.execute("""
+            SELECT table_type FROM information_schema.tables
+            WHERE table_schema = current_schema() AND table_name = 'schedules'
+        """)
+        row = cur.fetchone()
+        return row is not None and row[0] == 'BASE TABLE'
+    cur.execute("SELECT type FROM sqlite_master WHERE name = 'schedules'")
+    row = cur.fetchone()
+    return row is not None and row[0] == 'table'
+
+def _migrate_legacy_schedules(cur, backend):
+    """Move rows of the old schedules table into the normalized tables"""
+    if backend == 'postgres':
+        # Tables created before versioning lack these columns; their rows
+        # become version 0
+        cur.execute("""
+            ALTER TABLE schedules
+                ADD COLUMN IF NOT EXISTS presentation_key TEXT,
+                ADD COLUMN IF NOT EXISTS row_hash TEXT,
+                ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS valid_from INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS valid_to INTEGER
+        """)
+
+    cur.execute("""
+        INSERT INTO presentations (id, date_time, topic, student, room, created_at,
+                                   presentation_key, row_hash, revision, valid_from, valid_to)
+        SELECT id, date_time, topic, student, room, created_at,
+               presentation_key, row_hash, revision, valid_from, valid_to
+        FROM schedules
+    """)
+
+    # Keys are computed in Python, as on every later write, so lookups
+    # match names outside ASCII on both backends
+    cur.execute("SELECT id, student, presentation_key, president, rapporteur, supervisor FROM schedules")
+    rows = cur.fetchall()
+    cur.executemany(
+        "UPDATE presentations SET presentation_key = %s WHERE id = %s",
+        [(presentation_key(student), row_id) for row_id, student, key, *_ in rows if key is None]
+    )
+
+    names = {}
+    for row in rows:
+        for name in row[3:]:
+            if name and lookup_name(name):
+                key = lookup_name(name)
+                names[key] = min(names.get(key, name.strip()), name.strip())
+    cur.executemany(
+        "INSERT INTO professors (name, name_key) VALUES (%s, %s) ON CONFLICT (name_key) DO NOTHING",
+        [(name, key) for key, name in names.items()]
+    )
+    cur.execute("SELECT name_key, id FROM professors")
+    professor_ids = dict(cur.fetchall())
+    cur.executemany(
+        "INSERT INTO jury_assignments (presentation_id, professor_id, role) VALUES (%s, %s, %s)",
+        [
+            (row[0], professor_ids[lookup_name(name)], role)
+            for row in rows
+            for role, name in zip(JURY_ROLES, row[3:])
+            if name and lookup_name(name)
+        ]
+    )
+
+    if backend == 'postgres':
+        cur.execute("""
+            SELECT setval(pg_get_serial_sequence('presentations', 'id'),
+                          COALESCE((SELECT MAX(id) FROM presentations), 0) + 1, false)
+        """)
+        cur.execute("DROP TABLE schedules CASCADE")
+    else:
+        cur.execute("DROP VIEW IF EXISTS active_schedules")
+        cur.execute("DROP TABLE schedules")
+    logger.info("Migrated the schedules table to presentations and jury_assignments")
+
+def _add_missing_columns(cur, backend, table, columns):
+    """Add columns introduced after the table was first created"""
+    if backend == 'postgres':
+        cur.execute(
+            f"ALTER TABLE {table} "
+            + ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {type_}" for name, type_ in columns.items())
+        )
+        return
+    cur.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cur.fetchall()}
+    for name, type_ in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type_}")
+
+def _backfill_student_keys(cur):
+    """Fill student_key of rows written before the column existed"""
+    cur.execute("SELECT id, student FROM presentations WHERE student_key IS NULL AND student IS NOT NULL")
+    rows = cur.fetchall()
+    if rows:
+        cur.executemany(
+            "UPDATE presentations SET student_key = %s WHERE id = %s",
+            [(lookup_name(student), row_id) for row_id, student in rows]
+        )
+        logger.info(f"Computed student keys of {len(rows)} presentations")
+
+def _create_indexes(cur):
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS presentations_open_key_idx
+        ON presentations (presentation_key) WHERE valid_to IS NULL
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS presentations_validity_idx
+        ON presentations (valid_from, valid_to)
+    """)
+    # Replaced by the Python-computed student_key
+    cur.execute("DROP INDEX IF EXISTS presentations_student_idx")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS presentations_student_key_idx
+        ON presentations (student_key)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS presentations_date_time_idx
+        ON presentations (date_time)
+    """)
+
+    # Professor lookups and workload aggregates scan this index only
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS jury_assignments_professor_idx
+        ON jury_assignments (professor_id, role, presentation_id)
+    """)
+
+    # Keyset pagination walks submissions newest first
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS student_submissions_date_idx
+        ON student_submissions (submission_date DESC, id DESC)
+    """)
+
+    # The worker claims due rows; the UI counts rows per batch and status
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS notification_outbox_due_idx
+        ON notification_outbox (status, next_attempt_at)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS notification_outbox_batch_idx
+        ON notification_outbox (batch, status)
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS room_bookings_room_time_idx
+        ON room_bookings (room_id, start_time)
+    """)
+
+def _create_views(cur, backend):
+    if backend == 'postgres':
+        create = "CREATE OR REPLACE VIEW"
+    else:
+        # SQLite can't replace a view; recreate both so new columns show up
+        create = "CREATE VIEW"
+        cur.execute("DROP VIEW IF EXISTS active_schedules")
+        cur.execute("DROP VIEW IF EXISTS schedules")
+
+    # Compatibility view with the old one-row-per-presentation shape
+    cur.execute(f"""
+        {create} schedules AS
+        SELECT p.id, p.date_time, p.topic, p.student, p.room,
+               pr.name AS president, ra.name AS rapporteur, su.name AS supervisor,
+               p.created_at, p.presentation_key, p.row_hash, p.revision,
+               p.valid_from, p.valid_to,
+               p.department, p.classifier_version, p.confidence,
+               p.event_sequence, p.student_key, p.event_hash
+        FROM presentations p
+        LEFT JOIN jury_assignments jp ON jp.presentation_id = p.id AND jp.role = 'President'
+        LEFT JOIN professors pr ON pr.id = jp.professor_id
+        LEFT JOIN jury_assignments jr ON jr.presentation_id = p.id AND jr.role = 'Rapporteur'
+        LEFT JOIN professors ra ON ra.id = jr.professor_id
+        LEFT JOIN jury_assignments js ON js.presentation_id = p.id AND js.role = 'Supervisor'
+        LEFT JOIN professors su ON su.id = js.professor_id
+    """)
+
+    # Readers query this view instead of the versioned table
+    cur.execute(f"""
+        {create} active_schedules AS
+        SELECT s.*
+        FROM schedules s
+        JOIN schedule_active a
+          ON s.valid_from <= a.version_id
+         AND (s.valid_to IS NULL OR s.valid_to > a.version_id)
+    """)
+
+def init_schema(cur):
+    """Create every table, index and view of the app (once per process).
+
+    The same schema is created on PostgreSQL and on the embedded SQLite
+    backend; only the id and JSON column types differ.
+    """
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        backend = backend_name()
+        _create_tables(cur, TYPES[backend])
+        if _legacy_schedules_table(cur, backend):
+            _migrate_legacy_schedules(cur, backend)
+        for table in CLASSIFIED_TABLES:
+            _add_missing_columns(cur, backend, table, CLASSIFICATION_COLUMNS)
+        _add_missing_columns(cur, backend, 'presentations', EVENT_COLUMNS)
+        _add_missing_columns(cur, backend, 'presentations', SUBJECT_COLUMNS)
+        _add_missing_columns(cur, backend, 'presentations', STUDENT_KEY_COLUMNS)
+        _backfill_student_keys(cur)
+        _create_indexes(cur)
+        _create_views(cur, backend)
+
+        _schema_ready = True
+        logger.info(f"Database schema ready ({backend})")